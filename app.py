@@ -1,38 +1,264 @@
 # app.py
 # Single-file Flask website + Discord OAuth2 dashboard for VRTEX
 # Save as app.py. Requires: pip install flask requests
+# Set DISCORD_API_BASE to point the dashboard at a local stub Discord API.
+# STARTUP_PROFILE=1 logs where startup time went; WARM_UP=eager|after_first|off (see startup.py).
 
-import os, json, pathlib, requests
-from flask import Flask, render_template_string, request, redirect, session, jsonify, send_from_directory, url_for
+import startup  # first, so the startup profile covers every other import
+import os, json, pathlib, atexit, math, time, hmac, base64
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, render_template_string, request, redirect, session, jsonify, send_from_directory, url_for, g, Response
 from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
+from settings_store import SettingsStore, VersionConflict
+from discord_client import DiscordClient, RateLimitState, RateLimited, UpstreamError, token_key
+from cache import TieredCache
+from shared_cache import RedisTier
+from members import MembershipIndex
+from sessions import ServerSessionInterface, MemorySessionBackend, SqliteSessionBackend
+from settings_schema import Invalid, PREMIUM, merge_patch, diff, validate
+from ratelimit import RateLimiter, MemoryBuckets, SqliteBuckets
+from tokens import TokenRefresher, TOKEN_REFRESHES, store_token, needs_refresh
+from assets import CompressedAsset, AssetPipeline, send_asset, IMMUTABLE
+from audit import AuditLog
+import metrics
+from startup import PROFILER, Lazy
+
+PROFILER.mark("imports")
+metrics.REGISTRY.add_collector(PROFILER.collect)
 
 BASE = pathlib.Path(__file__).parent
 SETTINGS_PATH = BASE / "server_settings.json"
 MEMBERS_PATH = BASE / "members.json"
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") != "0"
+WARM_UP = os.getenv("WARM_UP", "after_first")
+
+# Guild settings live in memory; writes go to an append-only journal that is
+# compacted into server_settings.json in the background.
+# Safe to share between gunicorn workers: writes are flock'ed and versioned.
+# Loaded on first use (or by the warm-up), not at import.
+def open_settings_store():
+    if not SETTINGS_PATH.exists():
+        SETTINGS_PATH.write_text(json.dumps({}, indent=2))
+    store = SettingsStore(SETTINGS_PATH, fsync=os.getenv("SETTINGS_FSYNC", "1") != "0").load().start()
+    atexit.register(store.close)
+    return store
 
-# Ensure persistence files exist
-if not SETTINGS_PATH.exists():
-    SETTINGS_PATH.write_text(json.dumps({}, indent=2))
-if not MEMBERS_PATH.exists():
-    MEMBERS_PATH.write_text(json.dumps({"plus_members": []}, indent=2))
+settings_store = Lazy("settings_store", open_settings_store)
 
-def read_json(p):
-    return json.loads(pathlib.Path(p).read_text())
+DEFAULT_SETTINGS = {
+    "currency":"💰","tax":5,"prefix":"ve",
+    "daily_amount":3000,"drop_amount":1000,"work_multiplier":1.0,
+    "cooldowns":{"drop_seconds":3600},
+    "disabled_commands": []
+}
 
-def write_json(p, data):
-    pathlib.Path(p).write_text(json.dumps(data, indent=2))
+# VRTEX+ user ids, indexed in memory and reloaded when members.json changes
+def open_members():
+    if not MEMBERS_PATH.exists():
+        MEMBERS_PATH.write_text(json.dumps({"plus_members": []}, indent=2))
+    index = MembershipIndex(MEMBERS_PATH, check_interval=float(os.getenv("MEMBERS_CHECK_INTERVAL", 1.0)),
+                            on_change=lambda: plus_cache.clear())
+    index.refresh(force=True)
+    return index
+
+plus_members = Lazy("plus_members", open_members)
 
 # Config from environment
 DISCORD_CLIENT_ID = os.getenv("DISCORD_CLIENT_ID", "")
 DISCORD_CLIENT_SECRET = os.getenv("DISCORD_CLIENT_SECRET", "")
 REDIRECT_URI = os.getenv("REDIRECT_URI", "")  # e.g. https://yourdomain.com/dashboard/callback
 FLASK_SECRET = os.getenv("FLASK_SECRET", "change_this_secret")
-API_BASE = "https://discord.com/api"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # if set, /metrics requires "Authorization: Bearer <token>"
+API_BASE = os.getenv("DISCORD_API_BASE", "https://discord.com/api")
 MANAGE_GUILD = 1 << 5
 
-app = Flask(__name__, static_folder="static")
+# /static is served by static_files below through the asset pipeline
+app = Flask(__name__, static_folder=None)
 app.secret_key = FLASK_SECRET
 
+# Sessions live server-side and the cookie carries only an opaque id.
+# "memory" is per process; use SESSION_BACKEND=sqlite when running several workers.
+SESSION_TTL = float(os.getenv("SESSION_TTL", 7 * 86400))
+SESSION_BACKENDS = {
+    "memory": lambda: MemorySessionBackend(maxsize=int(os.getenv("SESSION_CACHE_SIZE", 100000)), ttl=SESSION_TTL),
+    "sqlite": lambda: SqliteSessionBackend(os.getenv("SESSION_DB", BASE / "server_sessions.db"), ttl=SESSION_TTL),
+}
+app.session_interface = ServerSessionInterface(SESSION_BACKENDS[os.getenv("SESSION_BACKEND", "memory")]())
+
+# every upstream call goes through one pooled, rate-limit-aware client; it
+# imports requests, so it is built on the first upstream call
+discord_limits = RateLimitState()
+discord = Lazy("discord", lambda: DiscordClient(API_BASE, limits=discord_limits))
+# fans out independent upstream calls made within a single request
+upstream_pool = ThreadPoolExecutor(max_workers=int(os.getenv("UPSTREAM_WORKERS", 16)), thread_name_prefix="upstream")
+
+# Caches are an in-process LRU with TTL, in front of an optional tier shared by
+# every worker and host: CACHE_URL=redis://[:password@]host:6379/0 (any
+# Redis-protocol server; bench/fake_redis.py stands in locally).
+CACHE_URL = os.getenv("CACHE_URL", "")
+shared_cache = RedisTier(CACHE_URL, prefix=os.getenv("CACHE_PREFIX", "vrtex:"),
+                         timeout=float(os.getenv("CACHE_TIMEOUT", 0.25))) if CACHE_URL else None
+
+# managed guilds per access token: {guild_id: guild}; short TTL, LRU-bounded
+guild_cache = TieredCache("guilds", maxsize=int(os.getenv("GUILD_CACHE_SIZE", 10000)),
+                          ttl=float(os.getenv("GUILD_CACHE_TTL", 60)), shared=shared_cache)
+# VRTEX+ status per user id; emptied everywhere when any worker sees members.json change
+plus_cache = TieredCache("plus", maxsize=int(os.getenv("PLUS_CACHE_SIZE", 100000)),
+                         ttl=float(os.getenv("PLUS_CACHE_TTL", 60)), shared=shared_cache)
+# (settings, version) per guild for the dashboard's reads, invalidated on every
+# write. Only with a shared tier: on one host the settings store already sees
+# every worker's writes and is the faster copy.
+settings_cache = TieredCache("settings", maxsize=int(os.getenv("SETTINGS_CACHE_SIZE", 10000)),
+                             ttl=float(os.getenv("SETTINGS_CACHE_TTL", 30)), shared=shared_cache) if shared_cache is not None else None
+metrics.watch_caches({"guilds": guild_cache, "plus": plus_cache,
+                      **({"settings": settings_cache} if settings_cache is not None else {})})
+
+REQUEST_LATENCY = metrics.REGISTRY.histogram("http_request_duration_seconds", "Request latency by route.",
+                                             ("route", "method", "status"))
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_latency(resp):
+    started = g.pop("request_started", None)
+    if started is not None:
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - started, rule, request.method, str(resp.status_code))
+    return resp
+
+# ------------------ Rate limits ------------------
+# Token buckets per user and per client IP on the routes that cost Discord
+# calls: {Flask rule: {"user": (rate per second, burst), "ip": (...)}}.
+# RATE_LIMITS='{"<rule>": {"user": [1, 5]}}' overrides a route; RATE_LIMITS=off disables all.
+RATE_LIMITS = {
+    "/dashboard/callback": {"ip": (0.2, 10)},
+    "/dashboard/api/guilds": {"user": (0.5, 5), "ip": (2, 20)},
+    "/dashboard/api/bootstrap": {"user": (0.5, 5), "ip": (2, 20)},
+    "/dashboard/api/update_settings/<guild_id>": {"user": (2, 10), "ip": (5, 30)},
+    "/dashboard/api/settings/<guild_id>": {"user": (2, 10), "ip": (5, 30)},
+    "/dashboard/api/get_settings_batch": {"user": (0.5, 5), "ip": (2, 20)},
+    "/dashboard/api/update_settings_batch": {"user": (0.5, 5), "ip": (2, 20)},
+}
+if os.getenv("RATE_LIMITS") == "off":
+    RATE_LIMITS = {}
+else:
+    RATE_LIMITS.update(json.loads(os.getenv("RATE_LIMITS", "{}")))
+# "memory" is per process; use RATE_LIMIT_BACKEND=sqlite to share buckets between workers
+RATE_LIMIT_BACKENDS = {
+    "memory": lambda: MemoryBuckets(),
+    "sqlite": lambda: SqliteBuckets(os.getenv("RATE_LIMIT_DB", BASE / "server_ratelimit.db")),
+}
+rate_limiter = RateLimiter(RATE_LIMIT_BACKENDS[os.getenv("RATE_LIMIT_BACKEND", "memory")](), RATE_LIMITS)
+
+# behind N reverse proxies, take the client address from X-Forwarded-For
+# (asgi.py applies the same rule to its native routes)
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", 0))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
+def rate_limit_user(sess):
+    user = sess.get("user") or {}
+    if user.get("id"):
+        return str(user["id"])
+    return token_key(sess["access_token"]) if "access_token" in sess else None
+
+@app.before_request
+def enforce_rate_limits():
+    rule = request.url_rule.rule if request.url_rule else None
+    if rule in RATE_LIMITS:
+        wait = rate_limiter.check(rule, rate_limit_user(session), request.remote_addr)
+        if wait:
+            raise RateLimited(wait)
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return "Unauthorized", 401
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+# the dashboard lists guilds by name and icon; the rest of each guild object stays upstream
+def guild_projection(g):
+    return {"id": str(g.get("id")), "name": g.get("name") or "", "icon": g.get("icon")}
+
+def guild_sort_key(g):
+    return [g["name"].casefold(), g["id"]]
+
+# {guild_id: projection} for guilds the user can manage, in listing order
+def managed_from(guilds):
+    managed = [guild_projection(g) for g in guilds if (int(g.get("permissions",0)) & MANAGE_GUILD) != 0]
+    return {g["id"]: g for g in sorted(managed, key=guild_sort_key)}
+
+# Guild listing pages. The cursor is the sort key of the last guild sent, so a
+# page boundary survives guilds being added or removed between requests.
+GUILD_PAGE = 50
+MAX_GUILD_PAGE = 200
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def cursor_value(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+def decode_cursor(cursor):
+    key = cursor_value(cursor)
+    if not (isinstance(key, list) and len(key) == 2 and all(isinstance(k, str) for k in key)):
+        raise ValueError("bad cursor")
+    return key
+
+# -> (body, status): managed guilds whose name contains ?q=, ?limit= at a time after ?cursor=
+def guild_page(managed, args):
+    try:
+        limit = min(int(args.get("limit", GUILD_PAGE)), MAX_GUILD_PAGE)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return {"error":"bad_limit","max":MAX_GUILD_PAGE}, 400
+    try:
+        after = decode_cursor(args["cursor"]) if args.get("cursor") else None
+    except ValueError:
+        return {"error":"bad_cursor"}, 400
+    q = (args.get("q") or "").strip().casefold()
+    page, total, more = [], 0, False
+    for g in managed.values():
+        if q and q not in g["name"].casefold():
+            continue
+        total += 1
+        if more or (after is not None and guild_sort_key(g) <= after):
+            continue
+        if len(page) == limit:
+            more = True
+        else:
+            page.append(g)
+    return {"guilds": page, "next_cursor": encode_cursor(guild_sort_key(page[-1])) if more else None,
+            "total": total}, 200
+
+def managed_guilds(token, refresh=False):
+    key = token_key(token)
+    if not refresh:
+        cached = guild_cache.get(key)
+        if cached is not None:
+            return cached
+    resp = discord.get_guilds(token)
+    if resp.status_code != 200:
+        guild_cache.pop(key)
+        return None
+    managed = managed_from(resp.json())
+    guild_cache.set(key, managed)
+    return managed
+
+@app.errorhandler(RateLimited)
+def upstream_rate_limited(e):
+    resp = jsonify({"error":"rate_limited","retry_after":e.retry_after})
+    resp.headers["Retry-After"] = str(math.ceil(e.retry_after))
+    return resp, 429
+
+@app.errorhandler(UpstreamError)
+def upstream_unavailable(e):
+    return jsonify({"error":"upstream_unavailable"}), 502
+
 # ------------------ Full HTML template (site + dashboard) ------------------
 # Logo: put logo image at ./static/logo.png to show it (the <img> is included near header)
 TEMPLATE = r"""
@@ -86,6 +312,7 @@ TEMPLATE = r"""
 .left{flex:1}
 .right{width:420px}
 .guild-card{padding:12px;border-radius:10px;background:linear-gradient(90deg, rgba(255,255,255,0.01),transparent);display:flex;justify-content:space-between;align-items:center;gap:8px;margin-bottom:8px}
+.guild-card img{width:32px;height:32px;border-radius:50%;margin-right:10px;vertical-align:middle}
 .form-row{display:flex;flex-direction:column;margin-top:8px}
 .form-row input,.form-row select{padding:10px;border-radius:8px;border:1px solid rgba(255,255,255,0.03);background:transparent;color:var(--text)}
 .note{font-size:13px;color:var(--muted);margin-top:10px}
@@ -265,7 +492,9 @@ footer{margin-top:36px;text-align:center;color:var(--muted);padding:20px}
         <div class="left">
           <div class="card">
             <h3>Your Manageable Servers</h3>
+            <input id="guildSearch" class="input" placeholder="Search servers" style="display:none;margin-top:8px" oninput="searchGuilds()"/>
             <div id="guildList" class="muted" style="margin-top:12px">Please login to see servers.</div>
+            <div id="guildMore" class="muted"></div>
           </div>
 
           <div class="card" style="margin-top:12px">
@@ -347,33 +576,122 @@ async function api(path, opts){
 }
 
 let selectedGuild = null;
+let selectedVersion = null;
+let loadedSettings = null;
+let isPlus = false;
 async function initDashboard(){
   document.getElementById('authArea').innerHTML = `<a class="btn" href="/dashboard/login">Login with Discord</a>`;
   try{
-    const user = await api('/dashboard/api/user');
+    // user, managed guilds, VRTEX+ status and the last opened guild's settings in one round trip
+    const last = localStorage.getItem('vrtexGuild');
+    const boot = await api('/dashboard/api/bootstrap' + (last ? `?guild_id=${encodeURIComponent(last)}` : ''));
+    const user = boot.user;
+    isPlus = !!boot.is_plus;
     if(user && user.id){
       document.getElementById('authArea').innerHTML = `<div class="muted">Logged in as ${user.username}#${user.discriminator}</div> <a class="btn" href="/dashboard/logout">Logout</a>`;
-      const guilds = await api('/dashboard/api/guilds');
-      const gl = document.getElementById('guildList'); gl.innerHTML = '';
-      if(!guilds || guilds.length===0){ gl.innerHTML = '<div class="muted">No manageable guilds found.</div>'; return; }
-      guilds.forEach(g=>{
-        const el = document.createElement('div'); el.className='guild-card';
-        el.innerHTML = `<div><strong>${g.name}</strong><div class="muted" style="font-size:12px">${g.id}</div></div><div><button class="btn" onclick="openEditor('${g.id}','${escape(g.name)}')">Configure</button></div>`;
-        gl.appendChild(el);
-      });
+      document.getElementById('guildSearch').style.display = 'block';
+      renderGuilds(boot.guilds, true);
+      const g = boot.settings && boot.guild;
+      if(g) openEditor(g.id, escape(g.name), boot.settings, boot.settings_version);
     }
   }catch(e){
     // not logged in
   }
 }
 
-async function openEditor(guildId,gnameEsc){
+// Guild list: one page at a time from /dashboard/api/guilds, appended when the
+// #guildMore sentinel below the list scrolls into view.
+let guildQuery = '';
+let guildCursor = null;
+let guildRequest = 0;   // responses to an older search are dropped
+let guildLoading = false;
+let guildObserver = null;
+let guildSearchTimer = null;
+
+function guildCard(g){
+  const el = document.createElement('div'); el.className='guild-card';
+  const info = document.createElement('div');
+  if(g.icon){
+    const img = document.createElement('img'); img.loading = 'lazy'; img.alt = '';
+    img.src = `https://cdn.discordapp.com/icons/${g.id}/${g.icon}.png?size=64`;
+    info.appendChild(img);
+  }
+  const text = document.createElement('span'); text.style.display = 'inline-block'; text.style.verticalAlign = 'middle';
+  const name = document.createElement('strong'); name.textContent = g.name;
+  const id = document.createElement('div'); id.className = 'muted'; id.style.fontSize = '12px'; id.textContent = g.id;
+  text.append(name, id); info.appendChild(text);
+  const btn = document.createElement('button'); btn.className = 'btn'; btn.textContent = 'Configure';
+  btn.onclick = () => openEditor(g.id, escape(g.name));
+  const right = document.createElement('div'); right.appendChild(btn);
+  el.append(info, right);
+  return el;
+}
+
+function renderGuilds(page, reset){
+  const gl = document.getElementById('guildList');
+  const more = document.getElementById('guildMore');
+  if(reset) gl.textContent = '';
+  guildCursor = page.next_cursor;
+  if(reset && page.guilds.length===0){
+    gl.innerHTML = `<div class="muted">${guildQuery ? 'No servers match your search.' : 'No manageable guilds found.'}</div>`;
+  }else{
+    const frag = document.createDocumentFragment();
+    page.guilds.forEach(g=>frag.appendChild(guildCard(g)));
+    gl.appendChild(frag);
+  }
+  more.innerText = guildCursor ? `Showing ${gl.children.length} of ${page.total}…` : '';
+  if(!('IntersectionObserver' in window)){ more.onclick = loadMoreGuilds; return; }
+  if(!guildObserver) guildObserver = new IntersectionObserver(entries=>{ if(entries[0].isIntersecting) loadMoreGuilds(); });
+  // re-observe so a page too short to push the sentinel out of view loads the next one
+  guildObserver.unobserve(more); guildObserver.observe(more);
+}
+
+async function loadGuilds(reset){
+  const n = ++guildRequest;
+  const params = new URLSearchParams();
+  if(guildQuery) params.set('q', guildQuery);
+  if(!reset && guildCursor) params.set('cursor', guildCursor);
+  guildLoading = true;
+  try{
+    const page = await api('/dashboard/api/guilds?' + params);
+    if(n===guildRequest) renderGuilds(page, reset);
+  }catch(e){
+    if(n===guildRequest){ guildCursor = null; document.getElementById('guildMore').innerText = 'Could not load servers.'; }
+  }finally{
+    if(n===guildRequest) guildLoading = false;
+  }
+}
+
+function loadMoreGuilds(){
+  // one page in flight at a time; a new search supersedes it
+  if(guildCursor && !guildLoading) loadGuilds(false);
+}
+
+function searchGuilds(){
+  clearTimeout(guildSearchTimer);
+  guildSearchTimer = setTimeout(()=>{
+    guildQuery = document.getElementById('guildSearch').value.trim();
+    guildCursor = null;
+    loadGuilds(true);
+  }, 250);
+}
+
+async function openEditor(guildId,gnameEsc,preloaded,preloadedVersion){
   selectedGuild = guildId;
+  localStorage.setItem('vrtexGuild', guildId);
   document.getElementById('editor').style.display='block';
   document.getElementById('editorTitle').innerText = decodeURIComponent(gnameEsc) + ' — Settings';
   document.getElementById('editorMsg').innerText = '';
   try{
-    const s = await api(`/dashboard/api/get_settings/${guildId}`);
+    let s = preloaded;
+    selectedVersion = preloadedVersion;
+    if(!s){
+      const r = await fetch(`/dashboard/api/get_settings/${guildId}`);
+      if(!r.ok) throw await r.json().catch(()=>({error:'bad'}));
+      s = await r.json();
+      selectedVersion = (r.headers.get('ETag')||'').replace(/"/g,'');
+    }
+    loadedSettings = s;
     document.getElementById('f_currency').value = s.currency || '💰';
     document.getElementById('f_tax').value = s.tax || 5;
     document.getElementById('f_prefix').value = s.prefix || 've';
@@ -383,8 +701,7 @@ async function openEditor(guildId,gnameEsc){
     document.getElementById('f_dropcd').value = (s.cooldowns && s.cooldowns.drop_seconds) || 3600;
     document.getElementById('f_disabled_commands').value = (s.disabled_commands||[]).join(', ')
 
-    const plus = await api('/dashboard/api/is_plus');
-    if(!plus.is_plus){
+    if(!isPlus){
       ['f_daily','f_drop','f_workmult','f_dropcd'].forEach(id=>{document.getElementById(id).disabled=true; document.getElementById(id).style.opacity=0.6})
       document.getElementById('editorMsg').innerText = 'Upgrade to VRTEX+ to edit premium options.';
     } else {
@@ -398,7 +715,7 @@ async function openEditor(guildId,gnameEsc){
 
 document.getElementById('saveBtn').addEventListener('click', async ()=>{
   if(!selectedGuild){ document.getElementById('editorMsg').innerText='Select a server first.'; return; }
-  const payload = {
+  const form = {
     currency: document.getElementById('f_currency').value,
     tax: Number(document.getElementById('f_tax').value),
     prefix: document.getElementById('f_prefix').value,
@@ -408,12 +725,24 @@ document.getElementById('saveBtn').addEventListener('click', async ()=>{
     cooldowns: { drop_seconds: Number(document.getElementById('f_dropcd').value) },
     disabled_commands: document.getElementById('f_disabled_commands').value.split(',').map(s=>s.trim()).filter(Boolean)
   };
+  // premium inputs are disabled without VRTEX+: leave them out of the patch
+  if(!isPlus) ['daily_amount','drop_amount','work_multiplier','cooldowns'].forEach(k=>delete form[k]);
+  // send only the fields that were edited, as a JSON Merge Patch
+  const payload = {};
+  Object.keys(form).forEach(k=>{
+    if(JSON.stringify(form[k]) !== JSON.stringify((loadedSettings||{})[k])) payload[k] = form[k];
+  });
+  if(Object.keys(payload).length===0){ document.getElementById('editorMsg').innerText = 'No changes to save.'; return; }
   try{
-    const res = await fetch(`/dashboard/api/update_settings/${selectedGuild}`, {
-      method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload)
+    const headers = {'Content-Type':'application/merge-patch+json'};
+    if(selectedVersion !== null && selectedVersion !== undefined && selectedVersion !== '') headers['If-Match'] = `"${selectedVersion}"`;
+    const res = await fetch(`/dashboard/api/settings/${selectedGuild}`, {
+      method:'PATCH', headers, body: JSON.stringify(payload)
     });
     const json = await res.json();
     if(!res.ok) throw json;
+    loadedSettings = Object.assign({}, loadedSettings, payload);
+    selectedVersion = json.version;
     document.getElementById('editorMsg').innerText = 'Saved successfully.';
   }catch(err){
     const m = err && err.message ? err.message : JSON.stringify(err);
@@ -421,7 +750,7 @@ document.getElementById('saveBtn').addEventListener('click', async ()=>{
   }
 });
 
-document.getElementById('closeEditor').addEventListener('click', ()=>{ selectedGuild=null; document.getElementById('editor').style.display='none' });
+document.getElementById('closeEditor').addEventListener('click', ()=>{ selectedGuild=null; localStorage.removeItem('vrtexGuild'); document.getElementById('editor').style.display='none' });
 
 function showCompare(plan){
   document.getElementById('compareBox').style.display='block';
@@ -437,9 +766,38 @@ function showCompare(plan){
 
 # ------------------ Flask routes: site and OAuth endpoints ------------------
 
+# Static assets are content-hashed once at startup and served from memory under
+# /assets/<name>.<hash>.<ext> with immutable caching.
+ROOT_ASSETS = ("style.css", "scripts.js", "V.jpg")
+ROOT_PAGES = ("VRTEX.html", "commands.html")
+
+pipeline = AssetPipeline()
+for name in ROOT_ASSETS:
+    if (BASE / name).exists():
+        pipeline.add_file(BASE / name)
+pipeline.add_dir(BASE / "static", "static")
+pages = {name: CompressedAsset(pipeline.rewrite((BASE / name).read_text(encoding="utf-8")), "text/html")
+         for name in ROOT_PAGES if (BASE / name).exists()}
+PROFILER.mark("assets")
+
+# The landing page has no per-request variables: render it once (on the first
+# request that needs it, or in the warm-up), move its inline CSS/JS into
+# fingerprinted assets, keep gzip/br variants, and re-render only if TEMPLATE
+# is replaced.
+_landing = None
+
+def landing_page():
+    global _landing
+    if _landing is None or _landing[0] is not TEMPLATE:
+        with app.app_context():
+            html = render_template_string(TEMPLATE)
+        html = pipeline.rewrite(pipeline.externalize(html, "dashboard"))
+        _landing = (TEMPLATE, CompressedAsset(html, "text/html"))
+    return _landing[1]
+
 @app.route("/")
 def index():
-    return render_template_string(TEMPLATE)
+    return send_asset(landing_page())
 
 # Discord OAuth endpoints for dashboard
 @app.route("/dashboard/login")
@@ -449,12 +807,32 @@ def dash_login():
     scopes = "identify%20guilds"
     return redirect(f"{API_BASE}/oauth2/authorize?response_type=code&client_id={DISCORD_CLIENT_ID}&scope={scopes}&redirect_uri={REDIRECT_URI}")
 
-@app.route("/dashboard/callback")
-def dash_callback():
-    code = request.args.get("code")
-    if not code:
-        return "No code provided", 400
-    data = {
+def is_plus_user(uid):
+    if uid is None:
+        return False
+    plus_members.refresh()   # a members.json change clears plus_cache, hits included
+    plus = plus_cache.get(str(uid))
+    if plus is None:
+        plus = plus_members.is_plus(uid)
+        plus_cache.set(str(uid), plus)
+    return plus
+
+# the dashboard shows only these; the rest of /users/@me stays out of the session
+USER_FIELDS = ("id", "username", "discriminator", "global_name", "avatar")
+
+def user_projection(me):
+    return {k: me.get(k) for k in USER_FIELDS}
+
+# Fetched once per login, for a token just issued by the code exchange (so never
+# worth caching by token); the session keeps the result.
+def current_user(token):
+    me = discord.get_user(token)
+    if me.status_code != 200:
+        return None
+    return user_projection(me.json())
+
+def token_request(code):
+    return {
         "client_id": DISCORD_CLIENT_ID,
         "client_secret": DISCORD_CLIENT_SECRET,
         "grant_type": "authorization_code",
@@ -462,19 +840,77 @@ def dash_callback():
         "redirect_uri": REDIRECT_URI,
         "scope": "identify guilds"
     }
-    headers = {"Content-Type":"application/x-www-form-urlencoded"}
-    resp = requests.post(f"{API_BASE}/oauth2/token", data=data, headers=headers)
+
+def refresh_request(refresh_token):
+    return {
+        "client_id": DISCORD_CLIENT_ID,
+        "client_secret": DISCORD_CLIENT_SECRET,
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token,
+    }
+
+# New token dict, or None if Discord rejected the refresh token; raises on transient failures.
+def refresh_oauth_token(refresh_token):
+    resp = discord.exchange_code(refresh_request(refresh_token))
+    if resp.status_code in (400, 401):
+        return None
+    if resp.status_code >= 400:
+        raise UpstreamError(f"token refresh failed with {resp.status_code}")
+    return resp.json()
+
+# Cached upstream results follow a refreshed token to its new key.
+def token_refreshed(old, new):
+    value = guild_cache.pop(token_key(old))
+    if value is not None:
+        guild_cache.set(token_key(new), value)
+
+token_refresher = TokenRefresher(app.session_interface.backend, refresh_oauth_token, token_refreshed).start()
+atexit.register(token_refresher.close)
+
+# Inline fallback for a token about to expire. Returns True if the session changed.
+def refresh_session_token(sess, sid):
+    try:
+        token = refresh_oauth_token(sess["refresh_token"])
+    except UpstreamError:   # includes RateLimited
+        TOKEN_REFRESHES.inc("inline", "error")
+        return False   # keep the old token; the call itself may still succeed
+    if token is None:
+        TOKEN_REFRESHES.inc("inline", "rejected")
+        sess.clear()
+        return True
+    old = sess["access_token"]
+    store_token(sess, token)
+    TOKEN_REFRESHES.inc("inline", "ok")
+    token_refreshed(old, sess["access_token"])
+    token_refresher.schedule(sid, sess)
+    return True
+
+@app.before_request
+def refresh_expiring_token():
+    # dashboard routes only: touching the session elsewhere would add Vary: Cookie to static responses
+    if request.path.startswith("/dashboard/api/") and needs_refresh(session):
+        refresh_session_token(session, session.sid)
+
+@app.route("/dashboard/callback")
+def dash_callback():
+    code = request.args.get("code")
+    if not code:
+        return "No code provided", 400
+    resp = discord.exchange_code(token_request(code))
     if resp.status_code != 200:
         return f"Token error: {resp.text}", 400
-    token = resp.json()
-    session["access_token"] = token["access_token"]
-    me = requests.get(f"{API_BASE}/users/@me", headers={"Authorization":f"Bearer {token['access_token']}"})
-    if me.status_code == 200:
-        session["user"] = me.json()
+    session.regenerate()
+    store_token(session, resp.json())
+    user = current_user(session["access_token"])
+    if user is not None:
+        session["user"] = user
+    token_refresher.schedule(session.sid, session)
     return redirect("/#dashboard")
 
 @app.route("/dashboard/logout")
 def dash_logout():
+    if "access_token" in session:
+        guild_cache.pop(token_key(session["access_token"]))
     session.clear()
     return redirect("/")
 
@@ -486,78 +922,601 @@ def api_user():
 def api_guilds():
     if "access_token" not in session:
         return jsonify([]), 401
-    resp = requests.get(f"{API_BASE}/users/@me/guilds", headers={"Authorization":f"Bearer {session['access_token']}"})
-    if resp.status_code != 200:
+    managed = managed_guilds(session["access_token"])
+    if managed is None:
+        return jsonify({"error":"failed_fetch"}), 400
+    body, status = guild_page(managed, request.args)
+    return jsonify(body), status
+
+# Everything the dashboard needs on load in one response: the first page of
+# guilds (as /dashboard/api/guilds returns it); pass ?guild_id= to also get that
+# guild and its settings for the editor.
+def bootstrap_body(user, managed, is_plus, guild_id=None):
+    body = {"user": user, "guilds": guild_page(managed, {})[0], "is_plus": is_plus}
+    if guild_id and str(guild_id) in managed:
+        body["guild_id"] = str(guild_id)
+        body["guild"] = managed[str(guild_id)]
+        body["settings"], body["settings_version"] = guild_settings(guild_id)
+    return body
+
+@app.route("/dashboard/api/bootstrap")
+def api_bootstrap():
+    if "access_token" not in session:
+        return jsonify({"error":"not_logged_in"}), 401
+    user = session.get("user") or {}
+    guilds = upstream_pool.submit(managed_guilds, session["access_token"])
+    is_plus = is_plus_user(user.get("id"))
+    managed = guilds.result()
+    if managed is None:
         return jsonify({"error":"failed_fetch"}), 400
-    guilds = resp.json()
-    managed = [g for g in guilds if (int(g.get("permissions",0)) & MANAGE_GUILD) != 0]
-    return jsonify(managed)
+    return jsonify(bootstrap_body(user, managed, is_plus, request.args.get("guild_id")))
 
 @app.route("/dashboard/api/get_settings/<guild_id>")
 def api_get_settings(guild_id):
     if "access_token" not in session:
         return jsonify({"error":"not_logged_in"}), 401
-    settings = read_json(SETTINGS_PATH)
-    default = {
-        "currency":"💰","tax":5,"prefix":"ve",
-        "daily_amount":3000,"drop_amount":1000,"work_multiplier":1.0,
-        "cooldowns":{"drop_seconds":3600},
-        "disabled_commands": []
-    }
-    return jsonify(settings.get(guild_id, default))
+    settings, version = guild_settings(guild_id)
+    resp = jsonify(settings)
+    resp.set_etag(str(version))
+    return resp
 
 @app.route("/dashboard/api/update_settings/<guild_id>", methods=["POST"])
+@app.route("/dashboard/api/settings/<guild_id>", methods=["PATCH"])
 def api_update_settings(guild_id):
     if "access_token" not in session:
         return jsonify({"error":"not_logged_in"}), 401
     # verify user manages guild
-    resp = requests.get(f"{API_BASE}/users/@me/guilds", headers={"Authorization":f"Bearer {session['access_token']}"})
-    if resp.status_code != 200:
+    managed = managed_guilds(session["access_token"])
+    if managed is not None and str(guild_id) not in managed:
+        # cached list may predate the user gaining the permission: re-check upstream once
+        managed = managed_guilds(session["access_token"], refresh=True)
+    if managed is None:
         return jsonify({"error":"failed_fetch"}), 400
-    guilds = resp.json()
-    found = next((g for g in guilds if str(g.get("id"))==str(guild_id)), None)
-    if not found or (int(found.get("permissions",0)) & MANAGE_GUILD) == 0:
+    if str(guild_id) not in managed:
         return jsonify({"error":"no_permission"}), 403
 
     user = session.get("user", {})
-    uid = str(user.get("id"))
-    payload = request.json or {}
-    settings = read_json(SETTINGS_PATH)
-    members = read_json(MEMBERS_PATH).get("plus_members", [])
-    is_plus = uid in [str(x) for x in members]
-
-    allowed_basic = ["currency","tax","prefix","disabled_commands"]
-    allowed_premium = ["daily_amount","drop_amount","work_multiplier","cooldowns"]
-
-    current = settings.get(guild_id, {})
-    # apply basic
-    for k in allowed_basic:
-        if k in payload:
-            current[k] = payload[k]
-    # apply premium
-    for k in allowed_premium:
-        if k in payload:
-            if not is_plus:
-                return jsonify({"error":"premium_required","message":"VRTEX+ required to change this."}), 403
-            current[k] = payload[k]
-    settings[guild_id] = current
-    write_json(SETTINGS_PATH, settings)
-    return jsonify({"success":True,"settings":current})
+    body, status = apply_settings_update(guild_id, str(user.get("id")), request.json or {},
+                                         parse_if_match(request.headers.get("If-Match")))
+    resp = jsonify(body)
+    if "version" in body:
+        resp.set_etag(str(body["version"]))
+    return resp, status
+
+MAX_BATCH = int(os.getenv("MAX_SETTINGS_BATCH", 200))
+SETTINGS_UPDATES = metrics.REGISTRY.counter("settings_updates_total", "Settings updates by outcome.", ("outcome",))
+
+# Every settings write is queued for the audit log (audit.py) with who made it;
+# the diff and the disk write happen on its writer thread, not in the request.
+AUDIT_DIR = pathlib.Path(os.getenv("AUDIT_DIR", BASE / "audit"))
+
+def open_audit_log():
+    log = AuditLog(AUDIT_DIR, segment_bytes=int(os.getenv("AUDIT_SEGMENT_BYTES", 8 << 20)),
+                   fsync=os.getenv("AUDIT_FSYNC", "1") != "0").start()
+    atexit.register(log.close)
+    return log
+
+audit_log = Lazy("audit_log", open_audit_log)
+
+# The dashboard's view of a guild's settings: -> (settings, version)
+def guild_settings(guild_id):
+    if settings_cache is None:
+        return settings_store.get_versioned(guild_id, DEFAULT_SETTINGS)
+    cached = settings_cache.get(str(guild_id))
+    if cached is None:
+        cached = settings_store.get_versioned(guild_id, DEFAULT_SETTINGS)
+        settings_cache.set(str(guild_id), cached)
+        # a write that landed after our read may have sent its invalidation
+        # before our set: look again so a stale fill does not outlive it
+        if settings_store.version(guild_id) != cached[1]:
+            settings_cache.pop(str(guild_id))
+    return cached[0], cached[1]
+
+# After a write: drop the guilds from settings_cache in every worker (bulk: the whole cache)
+def settings_written(guild_ids, bulk=False):
+    if settings_cache is None:
+        return
+    if bulk:
+        settings_cache.clear()
+    else:
+        settings_cache.pop_many(map(str, guild_ids))
+
+# Wraps a settings_store mutate function to keep what it replaced in before[guild_id].
+def capturing(before, guild_id, mutate):
+    def wrapper(cur):
+        before[guild_id] = cur if cur is not None else DEFAULT_SETTINGS
+        return mutate(cur)
+    return wrapper
+
+# Updates are JSON Merge Patches (settings_schema.py); a guild with nothing
+# stored yet starts from DEFAULT_SETTINGS, and null resets a field to its default.
+def apply_patch(current, payload):
+    return merge_patch(current if current is not None else DEFAULT_SETTINGS, payload, DEFAULT_SETTINGS)
+
+# Stored settings with DEFAULT_SETTINGS filled in wherever a field is missing
+def with_defaults(settings, defaults=DEFAULT_SETTINGS):
+    out = dict(defaults)
+    for k, v in (settings or {}).items():
+        out[k] = with_defaults(v, defaults[k]) if isinstance(v, dict) and isinstance(defaults.get(k), dict) else v
+    return out
+
+# Validates a patch against the guild's current settings.
+# Returns (changed fields, None), or (None, (error body, status)).
+def check_update(current, payload, is_plus):
+    if not isinstance(payload, dict):
+        return None, ({"error":"bad_payload"}, 400)
+    try:
+        new = apply_patch(current, payload)
+        changed = diff(current if current is not None else DEFAULT_SETTINGS, new)
+    except Invalid as e:
+        SETTINGS_UPDATES.inc("invalid")
+        return None, ({"error":"invalid_setting","field":e.field,"message":e.message}, 400)
+    # premium fields may be sent at the value the editor shows, which for a field
+    # that was never stored is its default
+    if not is_plus and PREMIUM.intersection(diff(with_defaults(current), with_defaults(new))):
+        return None, ({"error":"premium_required","message":"VRTEX+ required to change this."}, 403)
+    return changed, None
+
+# If-Match: "<version>"[, ...] -> set of acceptable versions; None when absent or "*"
+def parse_if_match(header):
+    if not header or header.strip() == "*":
+        return None
+    versions = set()
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag.isdigit():
+            versions.add(int(tag))
+    return versions
+
+# Shared by the Flask and ASGI routes once the caller's permission is verified.
+# Only the changed fields are returned; a patch that changes nothing is not written.
+def apply_settings_update(guild_id, uid, payload, if_match=None):
+    current, version = settings_store.get_versioned(guild_id)
+    changed, err = check_update(current, payload, is_plus_user(uid))
+    if err:
+        return err
+    if not changed:
+        if if_match is not None and version not in if_match:
+            settings_written([guild_id])
+            return version_conflict(version)
+        SETTINGS_UPDATES.inc("noop")
+        return {"success":True,"changed":{},"version":version}, 200
+    before = {}
+    try:
+        new, version = settings_store.update(guild_id, capturing(before, guild_id, lambda cur: apply_patch(cur, payload)),
+                                             if_match)
+    except VersionConflict as e:
+        settings_written([guild_id])   # whatever the caller was shown is stale
+        return version_conflict(e.version)
+    SETTINGS_UPDATES.inc("changed")
+    settings_written([guild_id])
+    audit_log.record(uid, guild_id, before[guild_id], new, version)
+    # diff again: another worker may have written in between
+    return {"success":True,"changed":diff(before[guild_id], new),"version":version}, 200
+
+def version_conflict(version):
+    return {"error":"version_conflict","message":"Settings were changed elsewhere; reload and retry.",
+            "version":version}, 409
+
+# Batch endpoints: one permission check against the managed set, per-guild
+# results, and a single journal write for every accepted update.
+def batch_guild_ids(payload, key):
+    items = payload.get(key) if isinstance(payload, dict) else None
+    if not isinstance(items, (list, dict)) or not items:
+        return None, ({"error":"bad_payload","message":f"'{key}' must be a non-empty list or object"}, 400)
+    if len(items) > MAX_BATCH:
+        return None, ({"error":"batch_too_large","max":MAX_BATCH}, 413)
+    return items, None
+
+def batch_get(managed, guild_ids):
+    results = {}
+    for gid in map(str, guild_ids):
+        if gid not in managed:
+            results[gid] = {"error":"no_permission"}
+        else:
+            settings, version = guild_settings(gid)
+            results[gid] = {"settings": settings, "version": version}
+    return {"results": results}
+
+def batch_update(managed, uid, updates):
+    is_plus = is_plus_user(uid)
+    results, accepted, before = {}, {}, {}
+    for gid, payload in updates.items():
+        gid = str(gid)
+        if gid not in managed:
+            results[gid] = {"error":"no_permission"}
+            continue
+        current, version = settings_store.get_versioned(gid)
+        changed, err = check_update(current, payload, is_plus)
+        if err:
+            results[gid] = err[0]
+        elif not changed:
+            SETTINGS_UPDATES.inc("noop")
+            results[gid] = {"success":True,"changed":{},"version":version}
+        else:
+            accepted[gid] = capturing(before, gid, lambda cur, payload=payload: apply_patch(cur, payload))
+            results[gid] = None   # filled in once written, keeping the request's order
+    if accepted:
+        written = settings_store.update_many(accepted)
+        settings_written(written)
+        for gid, (new, version) in written.items():
+            # diff against what the write replaced: another worker may have written since the check
+            changed = diff(before[gid], new)
+            SETTINGS_UPDATES.inc("changed" if changed else "noop")
+            if changed:
+                audit_log.record(uid, gid, before[gid], new, version, "batch")
+            results[gid] = {"success":True,"changed":changed,"version":version}
+    return {"results": results}
+
+def managed_for_batch(token, guild_ids):
+    managed = managed_guilds(token)
+    if managed is not None and any(str(g) not in managed for g in guild_ids):
+        managed = managed_guilds(token, refresh=True)
+    return managed
+
+@app.route("/dashboard/api/get_settings_batch", methods=["POST"])
+def api_get_settings_batch():
+    if "access_token" not in session:
+        return jsonify({"error":"not_logged_in"}), 401
+    guild_ids, err = batch_guild_ids(request.get_json(silent=True), "guild_ids")
+    if err:
+        return jsonify(err[0]), err[1]
+    managed = managed_for_batch(session["access_token"], guild_ids)
+    if managed is None:
+        return jsonify({"error":"failed_fetch"}), 400
+    return jsonify(batch_get(managed, guild_ids))
+
+@app.route("/dashboard/api/update_settings_batch", methods=["POST"])
+def api_update_settings_batch():
+    if "access_token" not in session:
+        return jsonify({"error":"not_logged_in"}), 401
+    updates, err = batch_guild_ids(request.get_json(silent=True), "updates")
+    if err:
+        return jsonify(err[0]), err[1]
+    if not isinstance(updates, dict):
+        return jsonify({"error":"bad_payload","message":"'updates' must map guild id to settings"}), 400
+    managed = managed_for_batch(session["access_token"], updates)
+    if managed is None:
+        return jsonify({"error":"failed_fetch"}), 400
+    uid = str(session.get("user", {}).get("id"))
+    return jsonify(batch_update(managed, uid, updates))
 
 @app.route("/dashboard/api/is_plus")
 def api_is_plus():
     if "user" not in session:
         return jsonify({"is_plus":False})
-    uid = str(session["user"].get("id"))
-    members = read_json(MEMBERS_PATH).get("plus_members", [])
-    return jsonify({"is_plus": uid in [str(x) for x in members]})
+    return jsonify({"is_plus": is_plus_user(session["user"].get("id"))})
+
+# ------------------ Bot API: settings change feed ------------------
+# Bots follow settings changes instead of polling server_settings.json. Each
+# change carries the guild's new version (a global, monotonically increasing
+# sequence) and only the fields that changed. Consumers resume from the last
+# version they saw; "resync" means that point has left the feed and the full
+# settings must be reloaded (take the returned cursor first, then reload).
+BOT_API_TOKEN = os.getenv("BOT_API_TOKEN", "")  # bots send "Authorization: Bearer <token>"; unset disables /bot/api
+FEED_MAX_WAIT = float(os.getenv("FEED_MAX_WAIT", 30))
+FEED_POLL = float(os.getenv("FEED_POLL", 0.05))  # how quickly other workers' writes are noticed
+FEED_HEARTBEAT = 15
+FEED_MAX_LIMIT = 1000
+
+def bot_authorized(header):
+    return bool(BOT_API_TOKEN) and hmac.compare_digest(header or "", f"Bearer {BOT_API_TOKEN}")
+
+def bot_only(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if not bot_authorized(request.headers.get("Authorization")):
+            return jsonify({"error":"unauthorized"}), 401
+        return f(*args, **kwargs)
+    return wrapper
+
+# guild_ids=1,2,3 and/or shard_id=N&shard_count=M (Discord's (guild_id >> 22) % shard_count),
+# optionally narrowed to min_id..max_id (inclusive). -> (match or None, error)
+def guild_filter(args):
+    ids = {g for g in args.get("guild_ids", "").split(",") if g}
+    shard_id, shard_count = args.get("shard_id"), args.get("shard_count")
+    lo, hi = args.get("min_id"), args.get("max_id")
+    if not all(g.isdigit() for g in ids) or not all(v is None or v.isdigit() for v in (lo, hi)):
+        return None, ({"error":"bad_filter","message":"guild ids must be numeric"}, 400)
+    if shard_id is not None or shard_count is not None:
+        try:
+            shard_id, shard_count = int(shard_id), int(shard_count)
+        except (TypeError, ValueError):
+            return None, ({"error":"bad_filter","message":"shard_id and shard_count go together"}, 400)
+        if shard_count < 1 or not 0 <= shard_id < shard_count:
+            return None, ({"error":"bad_filter","message":"need 0 <= shard_id < shard_count"}, 400)
+    lo = int(lo) if lo is not None else None
+    hi = int(hi) if hi is not None else None
+    if not ids and shard_count is None and lo is None and hi is None:
+        return None, None
+    def match(gid):
+        if not gid.isdigit():
+            return False
+        n = int(gid)
+        if (lo is not None and n < lo) or (hi is not None and n > hi):
+            return False
+        if not ids and shard_count is None:
+            return True
+        return gid in ids or (shard_count is not None and (n >> 22) % shard_count == shard_id)
+    return match, None
+
+# -> ({"cursor", "match", "limit", "timeout"}, None) or (None, (error body, status))
+def feed_params(args, last_event_id=None):
+    try:
+        cursor = int(args.get("cursor") or last_event_id or 0)
+        limit = min(max(int(args.get("limit", 500)), 1), FEED_MAX_LIMIT)
+        timeout = float(args.get("timeout", 25))
+        if not math.isfinite(timeout):
+            raise ValueError(timeout)
+        timeout = min(max(timeout, 0.0), FEED_MAX_WAIT)
+    except ValueError:
+        return None, ({"error":"bad_request","message":"cursor, limit and timeout must be numbers"}, 400)
+    match, err = guild_filter(args)
+    if err:
+        return None, err
+    return {"cursor": cursor, "match": match, "limit": limit, "timeout": timeout}, None
+
+def sse_frame(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_frames(changes, cursor, resync):
+    if resync:
+        return sse_frame("resync", {"cursor": cursor}, cursor)
+    if changes:
+        return "".join(sse_frame("settings", c, c["version"]) for c in changes)
+    # a bare id moves Last-Event-ID past changes the filter skipped
+    return f"id: {cursor}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.route("/bot/api/settings/changes")
+@bot_only
+def bot_settings_changes():
+    params, err = feed_params(request.args)
+    if err:
+        return jsonify(err[0]), err[1]
+    changes, cursor, resync = settings_store.wait_changes(
+        params["cursor"], params["timeout"], params["match"], params["limit"], poll=FEED_POLL)
+    return jsonify({"cursor": cursor, "changes": changes, "resync": resync})
+
+@app.route("/bot/api/settings/stream")
+@bot_only
+def bot_settings_stream():
+    params, err = feed_params(request.args, request.headers.get("Last-Event-ID"))
+    if err:
+        return jsonify(err[0]), err[1]
+    def stream(cursor):
+        yield "retry: 2000\n\n"
+        while True:
+            changes, next_cursor, resync = settings_store.wait_changes(
+                cursor, FEED_HEARTBEAT, params["match"], params["limit"], poll=FEED_POLL)
+            yield sse_frames(changes, next_cursor, resync) if changes or resync or next_cursor != cursor else ": keepalive\n\n"
+            cursor = next_cursor
+    return Response(stream(params["cursor"]), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+# Bulk VRTEX+ lookup for the bot and admin tooling: {"user_ids": [...]} -> {"plus": [...]}
+MAX_PLUS_LOOKUP = 10000
+
+@app.route("/bot/api/plus/lookup", methods=["POST"])
+@bot_only
+def bot_plus_lookup():
+    payload = request.get_json(silent=True)
+    uids = payload.get("user_ids") if isinstance(payload, dict) else None
+    if not isinstance(uids, list):
+        return jsonify({"error":"bad_payload","message":"'user_ids' must be a list"}), 400
+    if len(uids) > MAX_PLUS_LOOKUP:
+        return jsonify({"error":"batch_too_large","max":MAX_PLUS_LOOKUP}), 413
+    return jsonify({"plus": plus_members.which(uids)})
+
+# ------------------ Bot API: NDJSON export / import ------------------
+# One guild per line, streamed both ways, so memory stays flat however many
+# guilds there are. The export's first line is {"cursor": N, "guilds": n}:
+# follow /bot/api/settings/changes from N to stay current after loading it.
+IMPORT_CHUNK = int(os.getenv("IMPORT_CHUNK", 500))
+IMPORT_MAX_LINE = 64 * 1024
+IMPORT_MAX_ERRORS = 100
+EXPORT_BATCH = 256
+
+def export_lines(cursor, items):
+    yield json.dumps({"cursor": cursor, "guilds": len(items)}) + "\n"
+    for i in range(0, len(items), EXPORT_BATCH):
+        yield "".join(json.dumps({"guild_id": gid, "version": version, "settings": settings},
+                                 ensure_ascii=False, separators=(",", ":")) + "\n"
+                      for gid, settings, version in items[i:i + EXPORT_BATCH])
+
+# Returns (validated settings, None) for a good import entry, else (None, error message).
+def check_import(entry):
+    if not isinstance(entry, dict):
+        return None, "expected a JSON object"
+    if not str(entry.get("guild_id", "")).isdigit():
+        return None, "guild_id must be numeric"
+    try:
+        return validate(entry.get("settings")), None
+    except Invalid as e:
+        return None, str(e)
 
-# serve static files (logo etc.)
+# Validates lines as they arrive and writes them IMPORT_CHUNK guilds at a time.
+# Bad lines are skipped and reported; good ones replace the guild's settings.
+class SettingsImporter:
+    def __init__(self, dry_run=False, chunk=IMPORT_CHUNK):
+        self.dry_run = dry_run
+        self.chunk = chunk
+        self.pending = {}
+        self.lines = self.imported = self.failed = 0
+        self.errors = []
+        self.version = None
+
+    def feed(self, line):
+        # line: bytes, or None for a line over IMPORT_MAX_LINE; -> True when a chunk is ready
+        self.lines += 1
+        if line is None:
+            return self._fail("line too long")
+        if not line.strip():
+            return False
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return self._fail("invalid JSON")
+        if isinstance(entry, dict) and "cursor" in entry and "guild_id" not in entry:
+            return False   # export header
+        settings, err = check_import(entry)
+        if err:
+            return self._fail(err)
+        self.pending[str(entry["guild_id"])] = settings
+        return len(self.pending) >= self.chunk
+
+    def _fail(self, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": self.lines, "error": message})
+        return False
+
+    def flush(self):
+        if self.pending and not self.dry_run:
+            before = {}
+            written = settings_store.update_many({gid: capturing(before, gid, lambda cur, s=settings: s)
+                                                  for gid, settings in self.pending.items()})
+            settings_written(written, bulk=True)
+            for gid, (new, version) in written.items():
+                audit_log.record(None, gid, before[gid], new, version, "import")
+            self.version = max(v for _, v in written.values())
+        self.imported += len(self.pending)
+        self.pending = {}
+
+    def result(self):
+        return {"dry_run": self.dry_run, "lines": self.lines, "imported": self.imported,
+                "failed": self.failed, "errors": self.errors, "version": self.version}
+
+def ndjson_lines(stream):
+    # yields each line, or None for one longer than IMPORT_MAX_LINE (the rest is skipped)
+    while True:
+        line = stream.readline(IMPORT_MAX_LINE + 1)
+        if not line:
+            return
+        if len(line) > IMPORT_MAX_LINE:
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(IMPORT_MAX_LINE)
+            yield None
+            continue
+        yield line
+
+@app.route("/bot/api/settings/export")
+@bot_only
+def bot_settings_export():
+    match, err = guild_filter(request.args)
+    if err:
+        return jsonify(err[0]), err[1]
+    cursor, items = settings_store.snapshot(match)
+    return Response(export_lines(cursor, items), mimetype="application/x-ndjson")
+
+@app.route("/bot/api/settings/import", methods=["POST"])
+@bot_only
+def bot_settings_import():
+    importer = SettingsImporter(dry_run=request.args.get("dry_run") in ("1", "true"))
+    for line in ndjson_lines(request.stream):
+        if importer.feed(line):
+            importer.flush()
+    importer.flush()
+    return jsonify(importer.result())
+
+# ------------------ Bot API: audit log ------------------
+# Settings changes, newest first: ?guild_id=, ?since= / ?until= (unix seconds,
+# since inclusive, until exclusive) and ?limit=. For the next page pass
+# next_cursor back as ?cursor= with the same filters; it marks a position in the
+# log, so records sharing a timestamp are never skipped. Records still in a
+# worker's queue show up once its writer flushes them.
+AUDIT_MAX_LIMIT = 1000
+
+def decode_audit_cursor(cursor):
+    # -> (ts, segment name, byte offset) as audit.query takes it
+    ts, segment, offset = cursor_value(cursor)
+    if isinstance(ts, bool) or not isinstance(ts, (int, float)) or not isinstance(segment, str) \
+            or isinstance(offset, bool) or not isinstance(offset, int):
+        raise ValueError("bad cursor")
+    return float(ts), segment, offset
+
+@app.route("/bot/api/audit")
+@bot_only
+def bot_audit():
+    gid = request.args.get("guild_id")
+    if gid is not None and not gid.isdigit():
+        return jsonify({"error":"bad_filter","message":"guild ids must be numeric"}), 400
+    try:
+        since = float(request.args["since"]) if request.args.get("since") else None
+        until = float(request.args["until"]) if request.args.get("until") else None
+        limit = min(max(int(request.args.get("limit", 100)), 1), AUDIT_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error":"bad_request","message":"since, until and limit must be numbers"}), 400
+    try:
+        before = decode_audit_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    except (ValueError, TypeError):
+        return jsonify({"error":"bad_cursor"}), 400
+    records, last = audit_log.query(gid, since, until, limit, before)
+    return jsonify({"records": records, "next_cursor": encode_cursor(last) if last else None})
+
+@app.route("/assets/<name>")
+def fingerprinted_asset(name):
+    asset = pipeline.get(name)
+    if asset is None and _landing is None:
+        landing_page()   # adds the landing page's CSS/JS to the pipeline
+        asset = pipeline.get(name)
+    if asset is None:
+        return "Not found", 404
+    return send_asset(asset, IMMUTABLE)
+
+@app.route("/<name>")
+def root_file(name):
+    if name in pages:
+        return send_asset(pages[name])
+    asset = pipeline.lookup(name) if name in ROOT_ASSETS else None
+    if asset is None:
+        return "Not found", 404
+    return send_asset(asset)
+
+# serve static files (logo etc.); files added after startup fall back to disk
 @app.route("/static/<path:p>")
 def static_files(p):
+    asset = pipeline.lookup(f"static/{p}")
+    if asset is not None:
+        return send_asset(asset)
     return send_from_directory(str(BASE / "static"), p)
 
+# ------------------ Warm-up ------------------
+# Builds whatever the first requests have not: the settings store, membership
+# index, Discord client and landing page. By default it runs in the background
+# right after the first response, so that response waits for none of it.
+def warm_up():
+    startup.warm_up((landing_page,))
+    if STARTUP_PROFILE:
+        startup.log_report()
+
+def first_response_sent():
+    if not PROFILER.responded():
+        return
+    if STARTUP_PROFILE:
+        startup.log_report()
+    if WARM_UP == "after_first":
+        startup.in_background(warm_up)
+
+@app.after_request
+def note_first_response(resp):
+    if PROFILER.first_response is None:
+        resp.call_on_close(first_response_sent)
+    return resp
+
+PROFILER.mark("app")
+if WARM_UP == "eager":
+    warm_up()
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8080))
-    print("Starting VRTEX site + dashboard on port", port)
-    app.run(host="0.0.0.0", port=port, debug=False)
+    if os.getenv("SERVER_MODE", "wsgi") == "asgi":
+        # async dashboard API (pip install httpx uvicorn); make `import app` reuse this module
+        import sys, uvicorn
+        sys.modules.setdefault("app", sys.modules[__name__])
+        from asgi import application
+        print("Starting VRTEX site + dashboard (ASGI) on port", port)
+        uvicorn.run(application, host="0.0.0.0", port=port)
+    else:
+        print("Starting VRTEX site + dashboard on port", port)
+        app.run(host="0.0.0.0", port=port, debug=False)
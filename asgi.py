@@ -0,0 +1,470 @@
+# asgi.py
+# Async serving mode. Dashboard routes that wait on discord.com run on the
+# event loop through AsyncDiscordClient; settings/members file I/O runs in
+# worker threads; every other path is handed to the Flask app in a thread.
+# Sessions go through the Flask app's server-side session store, so both modes
+# can serve the same users.
+#
+#   SERVER_MODE=asgi python app.py      (or: uvicorn asgi:application)
+# Requires: pip install httpx uvicorn
+
+import asyncio, io, json, math, re, sys, time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+import httpx
+from werkzeug.http import dump_cookie
+import app as site
+from discord_client import AsyncDiscordClient, RateLimited, token_key
+from ratelimit import MemoryBuckets
+from sessions import MemorySessionBackend, new_sid
+
+discord = AsyncDiscordClient(site.API_BASE, limits=site.discord_limits)
+sessions = site.app.session_interface
+COOKIE = site.app.config["SESSION_COOKIE_NAME"]
+
+# ------------------ request / response plumbing ------------------
+
+def client_address(headers, peer):
+    # behind TRUSTED_PROXIES proxies the client is that many entries from the
+    # right of X-Forwarded-For, as werkzeug's ProxyFix reads it for WSGI
+    if site.TRUSTED_PROXIES:
+        forwarded = [a.strip() for a in headers.get("x-forwarded-for", "").split(",")]
+        if headers.get("x-forwarded-for") and len(forwarded) >= site.TRUSTED_PROXIES:
+            return forwarded[-site.TRUSTED_PROXIES]
+    return peer
+
+class Request:
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.args = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        self.client = client_address(self.headers, (scope.get("client") or (None,))[0])
+        self.body = body
+        self.sid, self.session = None, {}
+        self.replaced = None
+        self.session_modified = False
+
+    async def load_session(self):
+        cookie = SimpleCookie(self.headers.get("cookie", ""))
+        self.sid, self.session = await session_io(sessions.load, cookie[COOKIE].value if COOKIE in cookie else None)
+
+    def regenerate_session(self):
+        self.replaced, self.sid = self.replaced or self.sid, new_sid()
+        self.session_modified = True
+
+    def json(self):
+        return json.loads(self.body) if self.body else {}
+
+# Session store calls (SQLite by default) run in a thread; the in-process
+# dict backend is cheap enough to call on the loop.
+async def session_io(fn, *args):
+    if isinstance(sessions.backend, MemorySessionBackend):
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+async def rate_limit_wait(rule, req):
+    # SQLite buckets take a write lock; only the in-process ones are checked on the loop
+    args = (rule, site.rate_limit_user(req.session), req.client)
+    if isinstance(site.rate_limiter.backend, MemoryBuckets):
+        return site.rate_limiter.check(*args)
+    return await asyncio.to_thread(site.rate_limiter.check, *args)
+
+def store_session(req):
+    # -> sid the cookie should carry, or None to clear it
+    if req.replaced:
+        sessions.backend.delete(req.replaced)
+    return sessions.save(req.sid, req.session)
+
+def respond(body, status=200, headers=None):
+    if isinstance(body, (dict, list)):
+        return status, [("content-type", "application/json")], json.dumps(body).encode(), headers
+    return status, [("content-type", "text/html; charset=utf-8")], body.encode(), headers
+
+def redirect(location):
+    return 302, [("location", location)], b"", None
+
+async def body_lines(receive, max_line):
+    # streams the request body line by line; None stands for a line over max_line
+    buf, skipping = b"", False
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        lines = (buf + message.get("body", b"")).split(b"\n")
+        buf = lines.pop()
+        for line in lines:
+            if skipping:
+                skipping = False   # tail of a line already reported as too long
+                continue
+            yield line if len(line) <= max_line else None
+        if len(buf) > max_line and not skipping:
+            yield None
+            skipping = True
+        if skipping:
+            buf = b""
+        if not message.get("more_body"):
+            if buf:
+                yield buf
+            return
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+def respond_stream(frames, content_type, headers=None):
+    # frames: async iterator of str, sent as they are produced
+    return 200, [("content-type", content_type)], frames, headers
+
+async def send_response(send, req, result, receive=None):
+    status, headers, body, extra = result
+    headers = list(headers) + list(extra or [])
+    if req.session_modified:
+        sid = await session_io(store_session, req)
+        if sid or req.sid or req.replaced:
+            headers.append(("set-cookie", dump_cookie(
+                COOKIE, sid or "", max_age=None if sid else 0, path="/", httponly=True,
+                secure=site.app.config["SESSION_COOKIE_SECURE"],
+                samesite=site.app.config["SESSION_COOKIE_SAMESITE"])))
+    if not isinstance(body, bytes):
+        return await send_stream(send, receive, status, headers, body)
+    headers.append(("content-length", str(len(body))))
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+    await send({"type": "http.response.body", "body": body})
+
+async def send_stream(send, receive, status, headers, frames):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+    # the request body is already read, so the next message is the disconnect
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        async for frame in frames:
+            if disconnected.done():
+                break
+            await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+        else:
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+        await frames.aclose()
+
+# ------------------ dashboard routes ------------------
+
+# Cache calls only: with a shared cache tier they can be network round trips and
+# run in a thread, except for hits in the local tier. Settings store calls stat,
+# flock and may replay the journal, so they always go through asyncio.to_thread.
+async def off_loop(fn, *args):
+    if site.shared_cache is None:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+async def cache_get(cache, key):
+    value = cache.peek(key) if cache.shared is not None else None
+    return value if value is not None else await off_loop(cache.get, key)
+
+async def managed_guilds(token, refresh=False):
+    key = token_key(token)
+    if not refresh:
+        cached = await cache_get(site.guild_cache, key)
+        if cached is not None:
+            return cached
+    resp = await discord.get_guilds(token)
+    if resp.status_code != 200:
+        await off_loop(site.guild_cache.pop, key)
+        return None
+    managed = site.managed_from(resp.json())
+    await off_loop(site.guild_cache.set, key, managed)
+    return managed
+
+async def current_user(token):
+    me = await discord.get_user(token)
+    if me.status_code != 200:
+        return None
+    return site.user_projection(me.json())
+
+async def dash_callback(req):
+    code = req.args.get("code")
+    if not code:
+        return respond("No code provided", 400)
+    resp = await discord.exchange_code(site.token_request(code))
+    if resp.status_code != 200:
+        return respond(f"Token error: {resp.text}", 400)
+    req.regenerate_session()
+    site.store_token(req.session, resp.json())
+    user = await current_user(req.session["access_token"])
+    if user is not None:
+        req.session["user"] = user
+    site.token_refresher.schedule(req.sid, req.session)
+    return redirect("/#dashboard")
+
+async def api_guilds(req):
+    if "access_token" not in req.session:
+        return respond([], 401)
+    managed = await managed_guilds(req.session["access_token"])
+    if managed is None:
+        return respond({"error":"failed_fetch"}, 400)
+    return respond(*site.guild_page(managed, req.args))
+
+async def api_update_settings(req, guild_id):
+    if "access_token" not in req.session:
+        return respond({"error":"not_logged_in"}, 401)
+    managed = await managed_guilds(req.session["access_token"])
+    if managed is not None and str(guild_id) not in managed:
+        managed = await managed_guilds(req.session["access_token"], refresh=True)
+    if managed is None:
+        return respond({"error":"failed_fetch"}, 400)
+    if str(guild_id) not in managed:
+        return respond({"error":"no_permission"}, 403)
+    try:
+        payload = req.json() or {}
+    except ValueError:
+        return respond({"error":"bad_json"}, 400)
+    uid = str(req.session.get("user", {}).get("id"))
+    body, status = await asyncio.to_thread(site.apply_settings_update, guild_id, uid, payload,
+                                           site.parse_if_match(req.headers.get("if-match")))
+    return respond(body, status, [("etag", f'"{body["version"]}"')] if "version" in body else None)
+
+async def api_bootstrap(req):
+    if "access_token" not in req.session:
+        return respond({"error":"not_logged_in"}, 401)
+    user = req.session.get("user") or {}
+    managed, is_plus = await asyncio.gather(
+        managed_guilds(req.session["access_token"]),
+        asyncio.to_thread(site.is_plus_user, user.get("id")))
+    if managed is None:
+        return respond({"error":"failed_fetch"}, 400)
+    return respond(await asyncio.to_thread(site.bootstrap_body, user, managed, is_plus, req.args.get("guild_id")))
+
+async def managed_for_batch(token, guild_ids):
+    managed = await managed_guilds(token)
+    if managed is not None and any(str(g) not in managed for g in guild_ids):
+        managed = await managed_guilds(token, refresh=True)
+    return managed
+
+async def api_get_settings_batch(req):
+    if "access_token" not in req.session:
+        return respond({"error":"not_logged_in"}, 401)
+    try:
+        payload = req.json()
+    except ValueError:
+        payload = None
+    guild_ids, err = site.batch_guild_ids(payload, "guild_ids")
+    if err:
+        return respond(*err)
+    managed = await managed_for_batch(req.session["access_token"], guild_ids)
+    if managed is None:
+        return respond({"error":"failed_fetch"}, 400)
+    return respond(await asyncio.to_thread(site.batch_get, managed, guild_ids))
+
+async def api_update_settings_batch(req):
+    if "access_token" not in req.session:
+        return respond({"error":"not_logged_in"}, 401)
+    try:
+        payload = req.json()
+    except ValueError:
+        payload = None
+    updates, err = site.batch_guild_ids(payload, "updates")
+    if err:
+        return respond(*err)
+    if not isinstance(updates, dict):
+        return respond({"error":"bad_payload","message":"'updates' must map guild id to settings"}, 400)
+    managed = await managed_for_batch(req.session["access_token"], updates)
+    if managed is None:
+        return respond({"error":"failed_fetch"}, 400)
+    uid = str(req.session.get("user", {}).get("id"))
+    return respond(await asyncio.to_thread(site.batch_update, managed, uid, updates))
+
+# ------------------ bot API: settings change feed ------------------
+# Same contract as the Flask routes, but waiting happens on the event loop so
+# an idle subscriber costs no thread.
+
+def bot_only(handler):
+    async def wrapper(req, *args):
+        if not site.bot_authorized(req.headers.get("authorization")):
+            return respond({"error":"unauthorized"}, 401)
+        return await handler(req, *args)
+    return wrapper
+
+def feed_poll(cursor, match, limit):
+    # changes_since takes the store's lock, which a writer holds through flock and fsync
+    site.settings_store.refresh()
+    return site.settings_store.changes_since(cursor, match, limit)
+
+async def feed_wait(cursor, timeout, match, limit):
+    deadline = time.monotonic() + timeout
+    while True:
+        changes, next_cursor, resync = await asyncio.to_thread(feed_poll, cursor, match, limit)
+        remaining = deadline - time.monotonic()
+        if changes or resync or not remaining > 0:   # also ends a NaN deadline
+            return changes, next_cursor, resync
+        cursor = next_cursor
+        await asyncio.sleep(min(site.FEED_POLL, remaining))
+
+@bot_only
+async def bot_settings_changes(req):
+    params, err = site.feed_params(req.args)
+    if err:
+        return respond(*err)
+    changes, cursor, resync = await feed_wait(params["cursor"], params["timeout"], params["match"], params["limit"])
+    return respond({"cursor": cursor, "changes": changes, "resync": resync})
+
+@bot_only
+async def bot_settings_stream(req):
+    params, err = site.feed_params(req.args, req.headers.get("last-event-id"))
+    if err:
+        return respond(*err)
+    async def frames(cursor):
+        yield "retry: 2000\n\n"
+        while True:
+            changes, next_cursor, resync = await feed_wait(cursor, site.FEED_HEARTBEAT, params["match"], params["limit"])
+            yield site.sse_frames(changes, next_cursor, resync) if changes or resync or next_cursor != cursor else ": keepalive\n\n"
+            cursor = next_cursor
+    return respond_stream(frames(params["cursor"]), "text/event-stream",
+                          [(k.lower(), v) for k, v in site.SSE_HEADERS.items()])
+
+def streams_body(handler):
+    # the handler reads req.receive itself instead of getting a buffered body
+    handler.streams_body = True
+    return handler
+
+@bot_only
+async def bot_settings_export(req):
+    match, err = site.guild_filter(req.args)
+    if err:
+        return respond(*err)
+    cursor, items = await asyncio.to_thread(site.settings_store.snapshot, match)
+    async def frames():
+        for chunk in site.export_lines(cursor, items):
+            yield chunk
+            await asyncio.sleep(0)
+    return respond_stream(frames(), "application/x-ndjson")
+
+@streams_body
+@bot_only
+async def bot_settings_import(req):
+    importer = site.SettingsImporter(dry_run=req.args.get("dry_run") in ("1", "true"))
+    async for line in body_lines(req.receive, site.IMPORT_MAX_LINE):
+        if importer.feed(line):
+            await asyncio.to_thread(importer.flush)
+    await asyncio.to_thread(importer.flush)
+    return respond(importer.result())
+
+# (method, Flask-style rule used as the metrics label, handler)
+ROUTES = [
+    ("GET", "/dashboard/callback", dash_callback),
+    ("GET", "/dashboard/api/guilds", api_guilds),
+    ("GET", "/dashboard/api/bootstrap", api_bootstrap),
+    ("POST", "/dashboard/api/update_settings/<guild_id>", api_update_settings),
+    ("PATCH", "/dashboard/api/settings/<guild_id>", api_update_settings),
+    ("POST", "/dashboard/api/get_settings_batch", api_get_settings_batch),
+    ("POST", "/dashboard/api/update_settings_batch", api_update_settings_batch),
+    ("GET", "/bot/api/settings/changes", bot_settings_changes),
+    ("GET", "/bot/api/settings/stream", bot_settings_stream),
+    ("GET", "/bot/api/settings/export", bot_settings_export),
+    ("POST", "/bot/api/settings/import", bot_settings_import),
+]
+ROUTES = [(m, rule, re.compile("^" + re.sub(r"<[^>]+>", "([^/]+)", rule) + "$"), h) for m, rule, h in ROUTES]
+
+def match(method, path):
+    for m, rule, pattern, handler in ROUTES:
+        found = pattern.match(path)
+        if found and m == method:
+            return handler, rule, found.groups()
+    return None, None, ()
+
+# ------------------ WSGI fallback ------------------
+# Everything else (landing page, assets, cheap in-memory API routes) runs in the
+# default thread pool, so a slow request never blocks the event loop.
+
+def wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]), "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0), "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body), "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True, "wsgi.multiprocess": True, "wsgi.run_once": False,
+    }
+    for k, v in scope["headers"]:
+        name = k.decode("latin-1").upper().replace("-", "_")
+        value = v.decode("latin-1")
+        if name == "CONTENT_TYPE" or name == "CONTENT_LENGTH":
+            environ[name] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def call_wsgi(environ):
+    started = {}
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+    result = site.app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], body
+
+async def wsgi_fallback(scope, body, send):
+    status, headers, body = await asyncio.to_thread(call_wsgi, wsgi_environ(scope, body))
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+    await send({"type": "http.response.body", "body": body})
+
+# ------------------ ASGI entry point ------------------
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await discord.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    handler, rule, args = match(scope["method"], scope["path"])
+    if handler is None:
+        return await wsgi_fallback(scope, await read_body(receive), send)
+    started = time.perf_counter()
+    streaming = getattr(handler, "streams_body", False)
+    req = Request(scope, b"" if streaming else await read_body(receive))
+    req.receive = receive
+    await req.load_session()
+    try:
+        if rule in site.RATE_LIMITS:
+            wait = await rate_limit_wait(rule, req)
+            if wait:
+                raise RateLimited(wait)
+        if site.needs_refresh(req.session):
+            if await asyncio.to_thread(site.refresh_session_token, req.session, req.sid):
+                req.session_modified = True
+        result = await handler(req, *args)
+    except RateLimited as e:
+        result = respond({"error":"rate_limited","retry_after":e.retry_after}, 429,
+                         [("retry-after", str(math.ceil(e.retry_after)))])
+    except httpx.HTTPError:
+        result = respond({"error":"upstream_unavailable"}, 502)
+    await send_response(send, req, result, receive)
+    site.first_response_sent()
+    site.REQUEST_LATENCY.observe(time.perf_counter() - started, rule, req.method, str(result[0]))
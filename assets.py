@@ -0,0 +1,127 @@
+# assets.py
+# Pre-encoded response bodies: each asset is compressed once (gzip, and
+# brotli when the optional `brotli` package is installed), tagged with a
+# strong ETag, and served with content negotiation and 304 revalidation.
+# AssetPipeline fingerprints files at startup so they can be cached forever.
+
+import gzip, hashlib, mimetypes, pathlib, re
+from flask import Response, request
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# preferred order when the client accepts several encodings
+ENCODINGS = ("br", "gzip")
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+class CompressedAsset:
+    def __init__(self, body, mimetype):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.variants = {"identity": body}
+        if not mimetype.startswith(COMPRESSIBLE):
+            return
+        gz = gzip.compress(body, 9, mtime=0)
+        if len(gz) < len(body):
+            self.variants["gzip"] = gz
+        if brotli is not None:
+            br = brotli.compress(body, quality=11)
+            if len(br) < len(body):
+                self.variants["br"] = br
+
+    def etag(self, encoding="identity"):
+        # strong validators must differ per representation
+        tag = self.digest[:32]
+        return tag if encoding == "identity" else f"{tag}-{encoding}"
+
+    def pick_encoding(self, accept_encodings):
+        for enc in ENCODINGS:
+            if enc in self.variants and accept_encodings[enc] > 0:
+                return enc
+        return "identity"
+
+    def matches(self, if_none_match):
+        return any(if_none_match.contains(self.etag(enc)) for enc in self.variants)
+
+def send_asset(asset, cache_control="no-cache"):
+    if request.range is not None:
+        # byte ranges are served from the identity representation only
+        resp = Response(asset.variants["identity"], mimetype=asset.mimetype)
+        resp.set_etag(asset.etag())
+        resp.headers["Cache-Control"] = cache_control
+        resp.headers["Vary"] = "Accept-Encoding"
+        return resp.make_conditional(request, accept_ranges=True,
+                                     complete_length=len(asset.variants["identity"]))
+    enc = asset.pick_encoding(request.accept_encodings)
+    if asset.matches(request.if_none_match):
+        resp = Response(status=304)
+    else:
+        resp = Response(asset.variants[enc], mimetype=asset.mimetype)
+        if enc != "identity":
+            resp.headers["Content-Encoding"] = enc
+    resp.set_etag(asset.etag(enc))
+    resp.headers["Cache-Control"] = cache_control
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Accept-Ranges"] = "bytes"
+    return resp
+
+# Content-hashed assets served under `prefix` as name.<hash>.ext
+class AssetPipeline:
+    def __init__(self, prefix="/assets/"):
+        self.prefix = prefix
+        self.files = {}     # fingerprinted file name -> CompressedAsset
+        self.names = {}     # logical path (e.g. "static/logo.png") -> fingerprinted file name
+
+    def add(self, logical, body, mimetype=None):
+        mimetype = mimetype or mimetypes.guess_type(logical)[0] or "application/octet-stream"
+        asset = CompressedAsset(body, mimetype)
+        p = pathlib.PurePosixPath(logical)
+        name = f"{p.stem}.{asset.digest[:12]}{p.suffix}"
+        self.files[name] = asset
+        self.names[logical] = name
+        return self.prefix + name
+
+    def add_file(self, path, logical=None):
+        path = pathlib.Path(path)
+        return self.add(logical or path.name, path.read_bytes())
+
+    def add_dir(self, root, logical_prefix):
+        root = pathlib.Path(root)
+        if not root.is_dir():
+            return
+        for path in sorted(root.rglob("*")):
+            if path.is_file():
+                self.add_file(path, f"{logical_prefix}/{path.relative_to(root).as_posix()}")
+
+    def get(self, name):
+        return self.files.get(name)
+
+    def lookup(self, logical):
+        name = self.names.get(logical)
+        return self.files[name] if name else None
+
+    def url(self, logical):
+        name = self.names.get(logical)
+        return self.prefix + name if name else None
+
+    def externalize(self, html, name):
+        # move the first inline <style> and attribute-less <script> into fingerprinted files
+        m = re.search(r"<style>(.*?)</style>", html, re.S)
+        if m:
+            url = self.add(f"{name}.css", m.group(1).strip() + "\n", "text/css")
+            html = html[:m.start()] + f'<link rel="stylesheet" href="{url}">' + html[m.end():]
+        m = re.search(r"<script>(.*?)</script>", html, re.S)
+        if m:
+            url = self.add(f"{name}.js", m.group(1).strip() + "\n", "application/javascript")
+            html = html[:m.start()] + f'<script src="{url}"></script>' + html[m.end():]
+        return html
+
+    def rewrite(self, html):
+        for logical, name in self.names.items():
+            html = html.replace(f'"/{logical}"', f'"{self.prefix}{name}"')
+        return html
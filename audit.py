@@ -0,0 +1,144 @@
+# audit.py
+# Append-only audit log of settings changes. record() only puts the change on
+# an in-process queue, so a save never waits on it; a background writer drains
+# the queue in batches, works out the field diff, appends one NDJSON line per
+# change and fsyncs once per batch. Each process writes its own segments:
+#   <dir>/<first record time in ms>-<pid>.ndjson
+# and starts a new one past segment_bytes. query() reads them back, skipping
+# segments that cannot hold records in the requested time range. Records are
+# ordered by (ts, segment, byte offset), which stays fixed once written, so a
+# page boundary never splits records that share a timestamp.
+
+import heapq, json, os, pathlib, queue, threading, time
+from settings_schema import diff
+from metrics import REGISTRY
+
+AUDIT_RECORDS = REGISTRY.counter("audit_records_total", "Audit records by outcome.", ("outcome",))
+
+class AuditLog:
+    def __init__(self, directory, segment_bytes=8 << 20, max_queue=100000, max_batch=1000, fsync=True):
+        self.dir = pathlib.Path(directory)
+        self.segment_bytes = segment_bytes
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._queue = queue.Queue(max_queue)
+        self._file = None
+        self._thread = None
+
+    def record(self, user_id, guild_id, before, after, version=None, source="dashboard"):
+        # before/after: whole settings documents; never blocks, drops the record if the writer is that far behind
+        try:
+            self._queue.put_nowait((time.time(), user_id, str(guild_id), before, after, version, source))
+        except queue.Full:
+            AUDIT_RECORDS.inc("dropped")
+
+    def start(self):
+        if self._thread is None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            try:
+                self._write([entry for entry in batch if entry is not None])
+            except Exception:
+                AUDIT_RECORDS.inc("error", amount=len(batch) - stop)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                if self._file:
+                    self._file.close()
+                return
+
+    def _write(self, batch):
+        if not batch:
+            return
+        lines = []
+        for ts, user_id, guild_id, before, after, version, source in batch:
+            entry = {"ts": round(ts, 6), "guild_id": guild_id, "user_id": user_id, "source": source,
+                     "version": version, "changes": diff(before, after), "previous": diff(after, before or {})}
+            lines.append(json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n")
+        f = self._segment(min(entry[0] for entry in batch))
+        f.write("".join(lines).encode("utf-8"))
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        AUDIT_RECORDS.inc("written", amount=len(batch))
+
+    def _segment(self, ts):
+        if self._file is not None and self._file.tell() >= self.segment_bytes:
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            self._file = open(self.dir / f"{int(ts * 1000):013d}-{os.getpid()}.ndjson", "ab")
+        return self._file
+
+    def flush(self):
+        # wait until everything recorded so far is on disk
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def segments(self, since=None, until=None):
+        # segment paths that may hold records with since <= ts < until
+        out = []
+        for path in sorted(self.dir.glob("*.ndjson")):
+            try:
+                start = int(path.name.split("-", 1)[0]) / 1000
+                mtime = path.stat().st_mtime
+            except (ValueError, OSError):
+                continue
+            # the name is the first record's time; the last write (mtime) is at or after the last record's
+            if (until is not None and start >= until) or (since is not None and mtime < since):
+                continue
+            out.append(path)
+        return out
+
+    def query(self, guild_id=None, since=None, until=None, limit=500, before=None):
+        # -> (records with since <= ts < until, newest first, at most limit; the
+        # position to pass back as `before` for the next page, or None on the last)
+        needle = f'"guild_id":{json.dumps(str(guild_id))}'.encode() if guild_id is not None else None
+        newest = []   # heap of ((ts, segment, offset), record): the newest limit + 1 seen so far
+        scan_until = until
+        if before is not None and (until is None or before[0] < until):
+            scan_until = before[0] + 0.001   # segment names are in whole milliseconds
+        for path in self.segments(since, scan_until):
+            try:
+                with open(path, "rb") as f:
+                    offset = 0
+                    for line in f:
+                        start, offset = offset, offset + len(line)
+                        if needle and needle not in line:
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue   # torn last line after a crash
+                        ts = entry.get("ts", 0)
+                        pos = (ts, path.name, start)
+                        if (since is None or ts >= since) and (until is None or ts < until) \
+                                and (before is None or pos < before):
+                            if len(newest) <= limit:
+                                heapq.heappush(newest, (pos, entry))
+                            else:
+                                heapq.heappushpop(newest, (pos, entry))
+            except OSError:
+                continue
+        newest.sort(key=lambda item: item[0], reverse=True)
+        more = len(newest) > limit
+        return [entry for _, entry in newest[:limit]], newest[limit - 1][0] if more else None
@@ -0,0 +1,115 @@
+# bench/fake_discord.py
+# Local stand-in for the parts of discord.com the dashboard uses:
+# POST /oauth2/token, GET /users/@me and GET /users/@me/guilds, with
+# configurable latency. Every OAuth code maps to its own user; like Discord,
+# every code exchange or refresh issues a new token (tok-<user>.<n>).
+#
+#   python bench/fake_discord.py --port 18081 --latency 0.05 --guilds 50
+
+import argparse, json, random, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+MANAGE_GUILD = 1 << 5
+
+class FakeDiscord:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, guilds=20, managed_ratio=0.5):
+        self.latency = latency
+        self.jitter = jitter
+        self.guilds = guilds
+        self.managed_ratio = managed_ratio
+        self.calls = {}
+        self._issued = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _send(self, code, body):
+                fake._sleep()
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _user(self):
+                auth = self.headers.get("Authorization", "")
+                return auth[len("Bearer tok-"):].split(".", 1)[0] if auth.startswith("Bearer tok-") else None
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                fake._count("GET " + path)
+                uid = self._user()
+                if uid is None:
+                    return self._send(401, {"message": "401: Unauthorized", "code": 0})
+                if path.endswith("/users/@me"):
+                    return self._send(200, {"id": uid, "username": f"bench{uid}", "discriminator": "0",
+                                            "avatar": None, "global_name": f"Bench {uid}"})
+                if path.endswith("/users/@me/guilds"):
+                    return self._send(200, fake.guild_list(uid))
+                self._send(404, {"message": "404: Not Found", "code": 0})
+
+            def do_POST(self):
+                path = self.path.split("?", 1)[0]
+                fake._count("POST " + path)
+                form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+                if path.endswith("/oauth2/token"):
+                    grant = form.get("grant_type", [""])[0]
+                    if grant == "refresh_token":
+                        uid = form.get("refresh_token", ["refresh-0"])[0].split("-", 1)[1].split(".", 1)[0]
+                    else:
+                        uid = form.get("code", ["0"])[0]
+                    n = fake._issue()
+                    return self._send(200, {"access_token": f"tok-{uid}.{n}", "refresh_token": f"refresh-{uid}.{n}",
+                                            "expires_in": 604800, "token_type": "Bearer", "scope": "identify guilds"})
+                self._send(404, {"message": "404: Not Found", "code": 0})
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+        self.base = f"http://{host}:{self.port}/api"
+
+    def _sleep(self):
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _issue(self):
+        with self._lock:
+            self._issued += 1
+            return self._issued
+
+    def _count(self, key):
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def guild_list(self, uid):
+        managed = int(self.guilds * self.managed_ratio)
+        return [{"id": str(1000 + i), "name": f"Guild {i}", "icon": None, "owner": i == 0,
+                 "permissions": str(MANAGE_GUILD if i < managed else 0), "features": []}
+                for i in range(self.guilds)]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-discord", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local fake Discord API for benchmarks")
+    ap.add_argument("--port", type=int, default=18081)
+    ap.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--guilds", type=int, default=20, help="guilds returned per user")
+    args = ap.parse_args()
+    fake = FakeDiscord(port=args.port, latency=args.latency, jitter=args.jitter, guilds=args.guilds)
+    print("Fake Discord API on", fake.base)
+    fake.server.serve_forever()
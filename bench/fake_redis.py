@@ -0,0 +1,154 @@
+# bench/fake_redis.py
+# Local stand-in for a Redis server, enough for the shared cache tier:
+# PING, AUTH, SELECT, GET, SET (EX/PX), DEL, INCR, PUBLISH and SUBSCRIBE over
+# RESP, with keys expiring lazily. One process-wide keyspace; no persistence.
+#
+#   python bench/fake_redis.py --port 6379
+#   CACHE_URL=redis://127.0.0.1:6379/0 python app.py
+
+import argparse, socketserver, threading, time
+
+class FakeRedis:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.data = {}          # key -> (value, expires_at or None)
+        self.subscribers = {}   # channel -> set of handlers
+        self.calls = {}
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def setup(self):
+                super().setup()
+                self.write_lock = threading.Lock()
+                self.channels = set()
+
+            def reply(self, value):
+                with self.write_lock:
+                    self.wfile.write(encode(value))
+                    self.wfile.flush()
+
+            def read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                if not line.startswith(b"*"):
+                    return line.split()   # inline command (e.g. from redis-cli / telnet)
+                args = []
+                for _ in range(int(line[1:])):
+                    n = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(n + 2)[:-2])
+                return args
+
+            def handle(self):
+                try:
+                    while True:
+                        args = self.read_command()
+                        if args is None:
+                            return
+                        if args:
+                            self.reply(fake.execute(self, args))
+                except (OSError, ValueError):
+                    pass
+                finally:
+                    fake.unsubscribe(self)
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler, bind_and_activate=False)
+        self.server.daemon_threads = True
+        self.server.allow_reuse_address = True
+        self.server.server_bind()
+        self.server.server_activate()
+        self.port = self.server.server_address[1]
+        self.url = f"redis://{host}:{self.port}/0"
+
+    def execute(self, conn, args):
+        cmd = args[0].upper().decode()
+        with self._lock:
+            self.calls[cmd] = self.calls.get(cmd, 0) + 1
+        if cmd == "PING":
+            return Simple("PONG")
+        if cmd in ("AUTH", "SELECT"):
+            return Simple("OK")
+        if cmd == "GET":
+            return self._get(args[1])
+        if cmd == "SET":
+            expires = None
+            opts = [a.upper() for a in args[3:]]
+            for i, opt in enumerate(opts[:-1]):
+                if opt in (b"EX", b"PX"):
+                    expires = time.monotonic() + int(args[4 + i]) / (1 if opt == b"EX" else 1000)
+            with self._lock:
+                self.data[args[1]] = (args[2], expires)
+            return Simple("OK")
+        if cmd == "DEL":
+            with self._lock:
+                return sum(self.data.pop(k, None) is not None for k in args[1:])
+        if cmd == "INCR":
+            with self._lock:
+                value = int(self._get(args[1]) or 0) + 1
+                self.data[args[1]] = (str(value).encode(), None)
+            return value
+        if cmd == "PUBLISH":
+            with self._lock:
+                targets = list(self.subscribers.get(args[1], ()))
+            for handler in targets:
+                try:
+                    handler.reply([b"message", args[1], args[2]])
+                except OSError:
+                    pass
+            return len(targets)
+        if cmd == "SUBSCRIBE":
+            with self._lock:
+                for ch in args[1:]:
+                    self.subscribers.setdefault(ch, set()).add(conn)
+                    conn.channels.add(ch)
+            return [b"subscribe", args[-1], len(conn.channels)]
+        return Error(f"ERR unknown command '{cmd}'")
+
+    def _get(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.monotonic():
+            self.data.pop(key, None)
+            return None
+        return item[0]
+
+    def unsubscribe(self, conn):
+        with self._lock:
+            for ch in getattr(conn, "channels", ()):
+                self.subscribers.get(ch, set()).discard(conn)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-redis", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class Simple(str):
+    pass
+
+class Error(str):
+    pass
+
+def encode(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Simple):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, Error):
+        return b"-%s\r\n" % value.encode()
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(v) for v in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local Redis stand-in for the shared cache tier")
+    ap.add_argument("--port", type=int, default=6379)
+    args = ap.parse_args()
+    fake = FakeRedis(port=args.port)
+    print("Fake Redis on", fake.url)
+    fake.server.serve_forever()
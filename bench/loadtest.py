@@ -0,0 +1,255 @@
+# bench/loadtest.py
+# Load test for app.py against bench/fake_discord.py. Copies the site into a
+# scratch directory, seeds server_settings.json with N guilds, starts the app
+# (WSGI or ASGI mode, or any --server-cmd), drives a weighted traffic mix from
+# concurrent virtual users and reports throughput and p50/p95/p99 per route.
+#
+#   python bench/loadtest.py --users 32 --duration 20 --settings-guilds 100,10000,100000
+#   python bench/loadtest.py --out before.json ... ; python bench/loadtest.py --out after.json ...
+#   python bench/loadtest.py --compare before.json after.json
+
+import argparse, json, math, os, pathlib, platform, random, shutil, socket, subprocess, sys, tempfile, threading, time
+import requests
+
+HERE = pathlib.Path(__file__).resolve().parent
+ROOT = HERE.parent
+sys.path.insert(0, str(HERE))
+from fake_discord import FakeDiscord
+
+SITE_FILES = ("*.py", "*.html", "*.css", "*.js", "*.jpg", "members.json")
+DEFAULT_MIX = "landing=40,guilds=15,settings_read=25,settings_save=15,login=5"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ------------------ environment ------------------
+
+def prepare_site(workdir, settings_guilds):
+    for pattern in SITE_FILES:
+        for p in ROOT.glob(pattern):
+            shutil.copy2(p, workdir / p.name)
+    if (ROOT / "static").is_dir():
+        shutil.copytree(ROOT / "static", workdir / "static")
+    settings = {str(1000 + i): {"currency": "💰", "tax": i % 20, "prefix": "ve",
+                                "disabled_commands": ["rob"] if i % 3 == 0 else []}
+                for i in range(settings_guilds)}
+    path = workdir / "server_settings.json"
+    path.write_text(json.dumps(settings, indent=2))
+    return path.stat().st_size
+
+def start_app(workdir, port, api_base, mode, server_cmd):
+    env = dict(os.environ, PORT=str(port), DISCORD_API_BASE=api_base, SERVER_MODE=mode,
+               DISCORD_CLIENT_ID="bench", DISCORD_CLIENT_SECRET="bench",
+               REDIRECT_URI="http://127.0.0.1/dashboard/callback", FLASK_SECRET="bench")
+    # every virtual user shares 127.0.0.1: keep the app's own rate limits out of the way unless asked for
+    env.setdefault("RATE_LIMITS", "off")
+    cmd = server_cmd.format(port=port).split() if server_cmd else [sys.executable, "app.py"]
+    # request logs go to a file: an unread pipe would fill up and stall the server
+    log = open(workdir / "server.log", "wb")
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    started = time.perf_counter()
+    deadline = started + 60
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("app exited during startup:\n" + (workdir / "server.log").read_text(errors="replace"))
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return proc, time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("app did not become ready within 60s")
+
+# ------------------ traffic ------------------
+
+class VirtualUser:
+    def __init__(self, base, uid, managed_ids):
+        self.base = base
+        self.uid = uid
+        self.managed_ids = managed_ids
+        self.http = requests.Session()
+
+    def login(self):
+        return self.http.get(f"{self.base}/dashboard/callback?code={self.uid}", allow_redirects=False)
+
+    def landing(self):
+        return self.http.get(f"{self.base}/", headers={"Accept-Encoding": "gzip"})
+
+    def guilds(self):
+        return self.http.get(f"{self.base}/dashboard/api/guilds")
+
+    def settings_read(self):
+        return self.http.get(f"{self.base}/dashboard/api/get_settings/{random.choice(self.managed_ids)}")
+
+    def settings_save(self):
+        payload = {"tax": random.randint(0, 20), "prefix": random.choice(["ve", "!", "v."]),
+                   "disabled_commands": random.sample(["rob", "work", "daily", "slots"], 2)}
+        return self.http.post(f"{self.base}/dashboard/api/update_settings/{random.choice(self.managed_ids)}",
+                              json=payload)
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(VirtualUser, name.strip()):
+            raise SystemExit(f"unknown route in mix: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def drive(base, users, duration, mix, managed_ids, warmup):
+    names, weights = list(mix), list(mix.values())
+    samples = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + warmup + duration
+    measure_from = time.perf_counter() + warmup
+
+    def run(uid):
+        vu = VirtualUser(base, uid, managed_ids)
+        vu.login()
+        local = {n: [] for n in names}
+        local_err = {n: 0 for n in names}
+        while True:
+            name = random.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            if t0 >= stop_at:
+                break
+            try:
+                ok = getattr(vu, name)().status_code < 400
+            except requests.RequestException:
+                ok = False
+            t1 = time.perf_counter()
+            if t0 >= measure_from:
+                local[name].append(t1 - t0)
+                if not ok:
+                    local_err[name] += 1
+        with lock:
+            for n in names:
+                samples[n].extend(local[n])
+                errors[n] += local_err[n]
+
+    threads = [threading.Thread(target=run, args=(str(i + 1),)) for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    routes = {}
+    for n in names:
+        lat = sorted(samples[n])
+        routes[n] = {
+            "requests": len(lat), "errors": errors[n], "rps": round(len(lat) / duration, 2),
+            "p50_ms": round(percentile(lat, 50) * 1000, 2) if lat else None,
+            "p95_ms": round(percentile(lat, 95) * 1000, 2) if lat else None,
+            "p99_ms": round(percentile(lat, 99) * 1000, 2) if lat else None,
+            "max_ms": round(lat[-1] * 1000, 2) if lat else None,
+        }
+    total = sum(r["requests"] for r in routes.values())
+    return {"total_rps": round(total / duration, 2), "routes": routes}
+
+# ------------------ runs, reports, comparisons ------------------
+
+def run_case(args, settings_guilds, user_guilds):
+    fake = FakeDiscord(latency=args.latency, jitter=args.jitter, guilds=user_guilds).start()
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix="vrtex-bench-"))
+    proc = None
+    try:
+        settings_bytes = prepare_site(workdir, settings_guilds)
+        port = free_port()
+        proc, startup_s = start_app(workdir, port, fake.base, args.mode, args.server_cmd)
+        managed_ids = [g["id"] for g in fake.guild_list("0") if int(g["permissions"]) & (1 << 5)] or ["1000"]
+        result = drive(f"http://127.0.0.1:{port}", args.users, args.duration, parse_mix(args.mix),
+                       managed_ids, args.warmup)
+        result.update({"settings_guilds": settings_guilds, "settings_bytes": settings_bytes,
+                       "user_guilds": user_guilds, "startup_s": round(startup_s, 3),
+                       "upstream_calls": dict(fake.calls)})
+        return result
+    finally:
+        if proc:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        fake.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_case(case):
+    print(f"\n== settings_guilds={case['settings_guilds']} ({case['settings_bytes']} bytes), "
+          f"user_guilds={case['user_guilds']}, startup {case['startup_s']}s, total {case['total_rps']} req/s")
+    print(f"{'route':<16}{'reqs':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in case["routes"].items():
+        print(f"{name:<16}{r['requests']:>8}{r['errors']:>6}{r['rps']:>10}"
+              f"{str(r['p50_ms']):>10}{str(r['p95_ms']):>10}{str(r['p99_ms']):>10}")
+    print("upstream calls:", case["upstream_calls"])
+
+def case_key(case):
+    return (case["settings_guilds"], case["user_guilds"])
+
+def compare(old_path, new_path):
+    old, new = json.loads(pathlib.Path(old_path).read_text()), json.loads(pathlib.Path(new_path).read_text())
+    print(f"{old.get('git_rev')} -> {new.get('git_rev')}")
+    old_cases = {case_key(c): c for c in old["cases"]}
+    for case in new["cases"]:
+        base = old_cases.get(case_key(case))
+        if not base:
+            continue
+        print(f"\n== settings_guilds={case['settings_guilds']} user_guilds={case['user_guilds']}: "
+              f"total {base['total_rps']} -> {case['total_rps']} req/s")
+        for name, r in case["routes"].items():
+            b = base["routes"].get(name)
+            if not b or not b["p95_ms"] or not r["p95_ms"]:
+                continue
+            change = (r["p95_ms"] - b["p95_ms"]) / b["p95_ms"] * 100
+            print(f"{name:<16} rps {b['rps']:>9} -> {r['rps']:<9} p95 {b['p95_ms']:>8} -> {r['p95_ms']:<8} ms ({change:+.1f}%)")
+
+def main():
+    ap = argparse.ArgumentParser(description="VRTEX dashboard load test")
+    ap.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    ap.add_argument("--duration", type=float, default=10.0, help="measured seconds per case")
+    ap.add_argument("--warmup", type=float, default=2.0)
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="route=weight,... from: landing, login, guilds, settings_read, settings_save")
+    ap.add_argument("--latency", type=float, default=0.05, help="fake Discord latency in seconds")
+    ap.add_argument("--jitter", type=float, default=0.01)
+    ap.add_argument("--settings-guilds", default="100", help="comma list: guilds seeded into server_settings.json")
+    ap.add_argument("--user-guilds", default="20", help="comma list: guilds each user belongs to")
+    ap.add_argument("--mode", choices=("wsgi", "asgi"), default="wsgi")
+    ap.add_argument("--server-cmd", help="custom server command, e.g. 'gunicorn -w 4 -b 127.0.0.1:{port} app:app'")
+    ap.add_argument("--out", help="write machine-readable results (JSON) here")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    args = ap.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+    cases = []
+    for sg in (int(x) for x in args.settings_guilds.split(",")):
+        for ug in (int(x) for x in args.user_guilds.split(",")):
+            case = run_case(args, sg, ug)
+            print_case(case)
+            cases.append(case)
+    if args.out:
+        report = {"git_rev": git_rev(), "timestamp": time.time(), "python": platform.python_version(),
+                  "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+                  "cases": cases}
+        pathlib.Path(args.out).write_text(json.dumps(report, indent=2))
+        print("\nresults written to", args.out)
+
+if __name__ == "__main__":
+    main()
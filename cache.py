@@ -0,0 +1,120 @@
+# cache.py
+# Small thread-safe LRU cache with a per-entry TTL, used for upstream
+# Discord results that are expensive to fetch and safe to reuse briefly.
+# TieredCache puts one in front of an optional shared tier (shared_cache.py)
+# that every worker and host reads, so a result fetched by one is a hit for all.
+
+import threading, time
+from collections import OrderedDict
+
+MISSING = object()
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class TieredCache:
+    # Values must be JSON-serializable once a shared tier is configured; they
+    # come back from it as plain JSON types (tuples as lists).
+    def __init__(self, name, maxsize=1024, ttl=60.0, shared=None, local_ttl=None):
+        self.name = name
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl if local_ttl is None else min(ttl, local_ttl))
+        self.shared = shared
+        self.hits = self.shared_hits = self.misses = 0
+        if shared is not None:
+            shared.subscribe(name, self._invalidated)
+
+    def peek(self, key):
+        # local tier only, never a network round trip; None on a miss (left to the get() that follows)
+        value = self.local.get(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def get(self, key, default=None):
+        value = self.local.get(key, MISSING)
+        if value is MISSING and self.shared is not None:
+            value = self.shared.get(self.name, key, MISSING)
+            if value is not MISSING:
+                self.local.set(key, value)
+                self.shared_hits += 1
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.local.set(key, value, min(ttl, self.local.ttl))
+        if self.shared is not None:
+            self.shared.set(self.name, key, value, ttl)
+
+    def pop(self, key, default=None):
+        # removes key here, from the shared tier and from every other process's local tier
+        value = self.local.pop(key, default)
+        if self.shared is not None:
+            self.shared.invalidate(self.name, [key])
+        return value
+
+    def pop_many(self, keys):
+        keys = list(keys)
+        for key in keys:
+            self.local.pop(key)
+        if self.shared is not None:
+            self.shared.invalidate(self.name, keys)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear(self.name)
+
+    def _invalidated(self, keys):
+        # another process changed keys (None: everything)
+        if keys is None:
+            self.local.clear()
+        else:
+            for key in keys:
+                self.local.pop(key)
+
+    def __len__(self):
+        return len(self.local)
@@ -0,0 +1,203 @@
+# discord_client.py
+# Shared HTTP client for discord.com: one pooled keep-alive session, per-call
+# timeouts and Discord rate-limit handling (per-route buckets, global limit,
+# 429 + Retry-After back-off). Point `base` at a local stub server to test.
+# AsyncDiscordClient is the same client for the ASGI mode (requires httpx).
+# requests/httpx are imported when a client is created, not with this module.
+
+import asyncio, threading, time, hashlib
+from metrics import REGISTRY
+
+DEFAULT_BASE = "https://discord.com/api"
+
+UPSTREAM_LATENCY = REGISTRY.histogram("discord_request_duration_seconds", "Discord API call latency.",
+                                      ("method", "endpoint", "status"))
+UPSTREAM_429 = REGISTRY.counter("discord_rate_limited_total", "429 responses received from Discord.",
+                                ("endpoint", "scope"))
+UPSTREAM_ERRORS = REGISTRY.counter("discord_request_errors_total", "Discord calls that failed without a response.",
+                                   ("endpoint", "error"))
+
+def token_key(token):
+    # user-token routes are limited per token; never keep raw tokens as dict keys
+    return hashlib.sha1(token.encode()).hexdigest()[:16] if token else ""
+
+class RateLimitState:
+    def __init__(self, max_wait=10.0):
+        # longest we are willing to sleep for a bucket reset or Retry-After before giving up
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._route_bucket = {}   # (method, path) -> bucket id from X-RateLimit-Bucket
+        self._buckets = {}        # (bucket id, token key) -> [remaining, reset_at]
+        self._global_until = 0.0
+
+    def delay(self, route, tkey):
+        now = time.monotonic()
+        with self._lock:
+            delay = max(0.0, self._global_until - now)
+            bucket = self._route_bucket.get(route)
+            state = self._buckets.get((bucket, tkey)) if bucket else None
+            if state and state[0] <= 0 and state[1] > now:
+                delay = max(delay, state[1] - now)
+            elif state:
+                # reserve a slot so concurrent callers queue behind us
+                state[0] -= 1
+        if delay > self.max_wait:
+            raise RateLimited(delay)
+        return delay
+
+    def update(self, route, tkey, resp):
+        h = resp.headers
+        bucket = h.get("X-RateLimit-Bucket")
+        if not bucket:
+            return
+        try:
+            remaining = int(h.get("X-RateLimit-Remaining", 1))
+            reset_after = float(h.get("X-RateLimit-Reset-After", 0))
+        except ValueError:
+            return
+        with self._lock:
+            self._route_bucket[route] = bucket
+            self._buckets[(bucket, tkey)] = [remaining, time.monotonic() + reset_after]
+
+    def limited(self, route, resp):
+        # returns seconds to wait before retrying a 429, recording global limits
+        scope = resp.headers.get("X-RateLimit-Scope") or ("global" if resp.headers.get("X-RateLimit-Global") else "user")
+        UPSTREAM_429.inc(route[1], scope)
+        try:
+            retry_after = float(resp.json().get("retry_after"))
+        except (ValueError, TypeError, AttributeError):
+            try:
+                retry_after = float(resp.headers.get("Retry-After", 1))
+            except ValueError:
+                retry_after = 1.0
+        if scope == "global":
+            with self._lock:
+                self._global_until = time.monotonic() + retry_after
+        return retry_after
+
+def _prepare(method, path, token, kw):
+    headers = kw.pop("headers", None) or {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return (method.upper(), path), token_key(token), headers
+
+class DiscordClient:
+    def __init__(self, base=DEFAULT_BASE, timeout=(3.05, 10), max_retries=3, max_wait=10.0, pool_size=32, limits=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.base = base.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limits = limits or RateLimitState(max_wait)
+        self.request_error = requests.RequestException
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, path, token=None, timeout=None, **kw):
+        route, tkey, headers = _prepare(method, path, token, kw)
+        for attempt in range(self.max_retries + 1):
+            delay = self.limits.delay(route, tkey)
+            if delay:
+                time.sleep(delay)
+            t0 = time.perf_counter()
+            try:
+                resp = self.session.request(method, self.base + path, headers=headers,
+                                            timeout=timeout or self.timeout, **kw)
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(path, type(e).__name__)
+                if isinstance(e, self.request_error):
+                    # callers catch UpstreamError, so they never need to import requests
+                    raise UpstreamError(f"{method} {path}: {e}") from e
+                raise
+            UPSTREAM_LATENCY.observe(time.perf_counter() - t0, route[0], path, str(resp.status_code))
+            self.limits.update(route, tkey, resp)
+            if resp.status_code != 429:
+                return resp
+            retry_after = self.limits.limited(route, resp)
+            if attempt == self.max_retries or retry_after > self.limits.max_wait:
+                return resp
+            time.sleep(retry_after)
+        return resp
+
+    def get(self, path, token=None, **kw):
+        return self.request("GET", path, token=token, **kw)
+
+    def post(self, path, token=None, **kw):
+        return self.request("POST", path, token=token, **kw)
+
+    # ---- endpoints used by the dashboard ----
+    def exchange_code(self, data):
+        return self.post("/oauth2/token", data=data,
+                         headers={"Content-Type":"application/x-www-form-urlencoded"})
+
+    def get_user(self, token):
+        return self.get("/users/@me", token=token)
+
+    def get_guilds(self, token):
+        return self.get("/users/@me/guilds", token=token)
+
+    def close(self):
+        self.session.close()
+
+class AsyncDiscordClient:
+    def __init__(self, base=DEFAULT_BASE, timeout=10.0, max_retries=3, max_wait=10.0, pool_size=100, limits=None):
+        import httpx  # optional: only the ASGI mode needs it
+        self.base = base.rstrip("/")
+        self.max_retries = max_retries
+        # share bucket state with the sync client when both run in one process
+        self.limits = limits or RateLimitState(max_wait)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=3.05),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+
+    async def request(self, method, path, token=None, **kw):
+        route, tkey, headers = _prepare(method, path, token, kw)
+        for attempt in range(self.max_retries + 1):
+            delay = self.limits.delay(route, tkey)
+            if delay:
+                await asyncio.sleep(delay)
+            t0 = time.perf_counter()
+            try:
+                resp = await self.client.request(method, self.base + path, headers=headers, **kw)
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(path, type(e).__name__)
+                raise
+            UPSTREAM_LATENCY.observe(time.perf_counter() - t0, route[0], path, str(resp.status_code))
+            self.limits.update(route, tkey, resp)
+            if resp.status_code != 429:
+                return resp
+            retry_after = self.limits.limited(route, resp)
+            if attempt == self.max_retries or retry_after > self.limits.max_wait:
+                return resp
+            await asyncio.sleep(retry_after)
+        return resp
+
+    async def get(self, path, token=None, **kw):
+        return await self.request("GET", path, token=token, **kw)
+
+    async def post(self, path, token=None, **kw):
+        return await self.request("POST", path, token=token, **kw)
+
+    async def exchange_code(self, data):
+        return await self.post("/oauth2/token", data=data,
+                               headers={"Content-Type":"application/x-www-form-urlencoded"})
+
+    async def get_user(self, token):
+        return await self.get("/users/@me", token=token)
+
+    async def get_guilds(self, token):
+        return await self.get("/users/@me/guilds", token=token)
+
+    async def close(self):
+        await self.client.aclose()
+
+class UpstreamError(Exception):
+    # a Discord call failed without a usable response
+    pass
+
+class RateLimited(UpstreamError):
+    def __init__(self, retry_after):
+        super().__init__(f"rate limited for {retry_after:.1f}s")
+        self.retry_after = retry_after
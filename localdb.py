@@ -0,0 +1,29 @@
+# localdb.py
+# A SQLite file shared by the workers on one host (server-side sessions,
+# rate-limit buckets). Each thread gets its own connection in autocommit and
+# WAL mode, so workers keep reading while another one writes; due() tells the
+# owner when to sweep stale rows, every `purge_every` writes.
+
+import itertools, sqlite3, threading
+
+class LocalDB:
+    def __init__(self, path, schema, synchronous="NORMAL", purge_every=1000):
+        self.path = str(path)
+        self.synchronous = synchronous
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = itertools.count(1)
+        self().execute(schema)
+
+    def __call__(self):
+        # -> this thread's connection
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(f"PRAGMA synchronous={self.synchronous}")
+        return db
+
+    def due(self):
+        # count one write; True once every purge_every writes
+        return next(self._writes) % self.purge_every == 0
@@ -0,0 +1,63 @@
+# members.py
+# VRTEX+ membership index. members.json is parsed once into a set of user
+# ids and re-read only when the file changes (inode, size or mtime), checked
+# at most once per check_interval seconds, so a plus check is a set lookup.
+
+import json, os, pathlib, threading, time
+from metrics import REGISTRY
+
+MEMBERS_RELOADS = REGISTRY.counter("members_reloads_total", "members.json reloads by outcome.", ("outcome",))
+
+class MembershipIndex:
+    def __init__(self, path, check_interval=1.0, on_change=None):
+        self.path = pathlib.Path(path)
+        self.check_interval = check_interval
+        self.on_change = on_change   # called when a reload changes the set (not on the first load)
+        self._members = frozenset()
+        self._seen = None        # (inode, size, mtime_ns) of the loaded file
+        self._checked = 0.0      # monotonic time of the last stat
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            self._checked = now
+            seen = self._stat()
+            if seen == self._seen and not force:
+                return
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8")) if seen else {}
+            except ValueError:
+                # caught mid-write: keep the old set and retry on the next check
+                MEMBERS_RELOADS.inc("error")
+                return
+            members = frozenset(str(x) for x in data.get("plus_members", []))
+            changed, first = members != self._members, not self._loaded
+            self._members, self._seen, self._loaded = members, seen, True
+            MEMBERS_RELOADS.inc("ok")
+        if changed and not first and self.on_change:
+            self.on_change()
+
+    def is_plus(self, uid):
+        self.refresh()
+        return uid is not None and str(uid) in self._members
+
+    def which(self, uids):
+        # -> the subset of uids that are VRTEX+, in input order
+        self.refresh()
+        members = self._members
+        return [u for u in map(str, uids) if u in members]
+
+    def __len__(self):
+        self.refresh()
+        return len(self._members)
@@ -0,0 +1,133 @@
+# metrics.py
+# Minimal in-process metrics with Prometheus text exposition. Recording is a
+# bisect plus a locked increment; nothing is formatted until /metrics is
+# scraped. Modules declare their metrics at import time against REGISTRY.
+
+import threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _labels(self.labelnames, k), v) for k, v in items]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        out = []
+        for k, counts, total, n in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                out.append((self.name + "_bucket", _labels(self.labelnames, k, ("le", le)), cumulative))
+            out.append((self.name + "_sum", _labels(self.labelnames, k), total))
+            out.append((self.name + "_count", _labels(self.labelnames, k), n))
+        return out
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # re-importing a module (e.g. app.py run as __main__) must not duplicate series
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, fn):
+        # fn() -> [(name, kind, help, [(labels dict, value), ...]), ...], called on scrape
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics, collectors = list(self._metrics.values()), list(self._collectors)
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(f"{name}{labels} {value}" for name, labels, value in m.samples())
+        for fn in collectors:
+            for name, kind, help, samples in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def watch_caches(caches):
+    # caches: {label: object with .hits, .misses and __len__; TieredCache also has .shared_hits}
+    def collect():
+        return [
+            ("cache_hits_total", "counter", "Cache lookups served from cache.",
+             [({"cache": n}, c.hits) for n, c in caches.items()]),
+            ("cache_shared_hits_total", "counter", "Cache lookups served from the shared tier.",
+             [({"cache": n}, c.shared_hits) for n, c in caches.items() if hasattr(c, "shared_hits")]),
+            ("cache_misses_total", "counter", "Cache lookups that missed.",
+             [({"cache": n}, c.misses) for n, c in caches.items()]),
+            ("cache_entries", "gauge", "Entries currently held.",
+             [({"cache": n}, len(c)) for n, c in caches.items()]),
+        ]
+    REGISTRY.add_collector(collect)
@@ -0,0 +1,88 @@
+# ratelimit.py
+# Token-bucket limits for our own routes, keyed by user and by client IP, so a
+# refresh-hammering user or a script is turned away before it costs Discord
+# quota. MemoryBuckets keeps each worker's buckets to itself; SqliteBuckets
+# (localdb.py) makes every worker on the host draw from the same ones, each
+# take a single write transaction.
+
+import threading, time
+from collections import OrderedDict
+from localdb import LocalDB
+from metrics import REGISTRY
+
+RATE_LIMITED = REGISTRY.counter("rate_limited_total", "Requests rejected by our own rate limits.", ("route", "scope"))
+
+def take(tokens, updated, now, rate, burst, cost=1.0):
+    # -> (tokens left, seconds until `cost` tokens are available; 0 if taken)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+class MemoryBuckets:
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()   # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1.0):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens, wait = take(tokens, updated, now, rate, burst, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+class SqliteBuckets:
+    PURGE_EVERY = 1000   # takes between sweeps of idle buckets
+    IDLE = 3600          # a bucket untouched this long is full again anyway
+
+    def __init__(self, path):
+        self.path = str(path)
+        # synchronous=OFF: losing a bucket in a crash only refills it
+        self._db = LocalDB(path, "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)",
+                           synchronous="OFF", purge_every=self.PURGE_EVERY)
+
+    def take(self, key, rate, burst, cost=1.0):
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, wait = take(*(row or (burst, now)), now, rate, burst, cost)
+            db.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            if self._db.due():
+                db.execute("DELETE FROM buckets WHERE updated < ?", (now - self.IDLE,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return wait
+
+class RateLimiter:
+    def __init__(self, backend, rules):
+        # rules: {route: {"user": (rate per second, burst), "ip": (rate per second, burst)}}
+        self.backend = backend
+        self.rules = rules
+
+    def check(self, route, user=None, ip=None):
+        # -> seconds to wait before retrying, or 0 if the request may proceed
+        limits = self.rules.get(route)
+        if not limits:
+            return 0.0
+        wait = 0.0
+        for scope, key in (("user", user), ("ip", ip)):
+            if key is None or scope not in limits:
+                continue
+            rate, burst = limits[scope]
+            w = self.backend.take(f"{scope}:{key}:{route}", rate, burst)
+            if w:
+                RATE_LIMITED.inc(route, scope)
+                wait = max(wait, w)
+        return wait
@@ -0,0 +1,114 @@
+# sessions.py
+# Server-side sessions. The cookie holds only an opaque random id; the
+# session dict lives in a backend:
+#   MemorySessionBackend  in-process LRU with TTL (one worker / process)
+#   SqliteSessionBackend  a local SQLite file shared by every worker on the host
+# Any object with get(sid), set(sid, data) and delete(sid) can be plugged in.
+
+import json, secrets, time
+from flask.sessions import SessionInterface, SecureCookieSession
+from cache import TTLCache
+from localdb import LocalDB
+
+def new_sid():
+    return secrets.token_urlsafe(32)
+
+class MemorySessionBackend:
+    def __init__(self, maxsize=100000, ttl=7 * 86400):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, sid):
+        data = self._cache.get(sid)
+        return dict(data) if data is not None else None
+
+    def set(self, sid, data):
+        self._cache.set(sid, dict(data))
+
+    def delete(self, sid):
+        self._cache.pop(sid)
+
+    def __len__(self):
+        return len(self._cache)
+
+class SqliteSessionBackend:
+    PURGE_EVERY = 1000   # writes between sweeps of expired rows
+
+    def __init__(self, path, ttl=7 * 86400):
+        self.path = str(path)
+        self.ttl = ttl
+        self._db = LocalDB(path, "CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)",
+                           purge_every=self.PURGE_EVERY)
+
+    def get(self, sid):
+        row = self._db().execute("SELECT data, expires FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, sid, data):
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+                   (sid, json.dumps(data, separators=(",", ":")), time.time() + self.ttl))
+        if self._db.due():
+            db.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+
+    def delete(self, sid):
+        self._db().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM sessions WHERE expires > ?", (time.time(),)).fetchone()[0]
+
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.replaced = None
+
+    def regenerate(self):
+        # new id on login, so an id planted before it can't be reused (session fixation)
+        self.replaced, self.sid = self.replaced or self.sid, new_sid()
+        self.modified = True
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, backend):
+        self.backend = backend
+
+    def load(self, sid):
+        # -> (sid, data) for a live session, else (None, {})
+        data = self.backend.get(sid) if sid else None
+        return (sid, data) if data is not None else (None, {})
+
+    def save(self, sid, data):
+        # -> sid the cookie should carry, or None to clear it
+        if not data:
+            if sid:
+                self.backend.delete(sid)
+            return None
+        sid = sid or new_sid()
+        self.backend.set(sid, dict(data))
+        return sid
+
+    def open_session(self, app, request):
+        sid, data = self.load(request.cookies.get(self.get_cookie_name(app)))
+        return ServerSession(data, sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain, path = self.get_cookie_domain(app), self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not session.modified:
+            return
+        if session.replaced:
+            self.backend.delete(session.replaced)
+        sid = self.save(session.sid, session)
+        if sid is None:
+            if session.sid or session.replaced:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+        response.set_cookie(name, sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
@@ -0,0 +1,66 @@
+# settings_cli.py
+# Bulk export / import of guild settings as NDJSON (one guild per line)
+# through a running site's bot API. Both directions stream, so dumps of any
+# size use constant memory here and on the server.
+#
+#   BOT_API_TOKEN=... python settings_cli.py export --shard-id 0 --shard-count 4 -o shard0.ndjson
+#   BOT_API_TOKEN=... python settings_cli.py export --min-id 1000 --max-id 2000 > part.ndjson
+#   BOT_API_TOKEN=... python settings_cli.py import backup.ndjson --dry-run
+
+import argparse, json, os, sys
+import requests
+
+def export(args, http):
+    params = {k: v for k, v in (("shard_id", args.shard_id), ("shard_count", args.shard_count),
+                                ("min_id", args.min_id), ("max_id", args.max_id),
+                                ("guild_ids", args.guild_ids)) if v is not None}
+    with http.get(f"{args.url}/bot/api/settings/export", params=params, stream=True, timeout=(5, 60)) as resp:
+        if resp.status_code != 200:
+            sys.exit(f"export failed: {resp.status_code} {resp.text}")
+        out = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for chunk in resp.iter_content(64 * 1024):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+
+def import_(args, http):
+    params = {"dry_run": "1"} if args.dry_run else {}
+    with open(args.file, "rb") as f:
+        # a file object is streamed from disk, not read into memory
+        resp = http.post(f"{args.url}/bot/api/settings/import", params=params, data=f,
+                         headers={"Content-Type": "application/x-ndjson"}, timeout=(5, 600))
+    if resp.status_code != 200:
+        sys.exit(f"import failed: {resp.status_code} {resp.text}")
+    result = resp.json()
+    print(json.dumps(result, indent=2))
+    if result["failed"]:
+        sys.exit(1)
+
+def main():
+    ap = argparse.ArgumentParser(description="Export / import VRTEX guild settings as NDJSON")
+    ap.add_argument("--url", default=os.getenv("SITE_URL", "http://127.0.0.1:8080"), help="site base URL")
+    ap.add_argument("--token", default=os.getenv("BOT_API_TOKEN", ""), help="bot API token (default: $BOT_API_TOKEN)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    ex = sub.add_parser("export", help="write settings as NDJSON")
+    ex.add_argument("-o", "--output", help="file to write (default: stdout)")
+    ex.add_argument("--shard-id", type=int)
+    ex.add_argument("--shard-count", type=int)
+    ex.add_argument("--min-id", help="lowest guild id to include")
+    ex.add_argument("--max-id", help="highest guild id to include")
+    ex.add_argument("--guild-ids", help="comma-separated guild ids")
+    im = sub.add_parser("import", help="replace settings for every guild in an NDJSON file")
+    im.add_argument("file")
+    im.add_argument("--dry-run", action="store_true", help="validate only")
+    args = ap.parse_args()
+
+    if not args.token:
+        sys.exit("a bot API token is required (--token or BOT_API_TOKEN)")
+    args.url = args.url.rstrip("/")
+    http = requests.Session()
+    http.headers["Authorization"] = f"Bearer {args.token}"
+    (export if args.command == "export" else import_)(args, http)
+
+if __name__ == "__main__":
+    main()
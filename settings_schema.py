@@ -0,0 +1,114 @@
+# settings_schema.py
+# Guild settings schema, compiled once into per-field validators, plus JSON
+# Merge Patch (RFC 7396) and the matching structural diff. An update only
+# validates the fields its patch touches, and the diff against the stored
+# settings tells the caller whether anything needs to be written at all.
+
+import copy, math
+
+class Invalid(ValueError):
+    def __init__(self, field, message):
+        super().__init__(f"{field}: {message}")
+        self.field = field
+        self.message = message
+
+# ---- field validators: value -> normalized value, or raise ValueError(message) ----
+
+def integer(lo, hi):
+    def check(v):
+        if isinstance(v, float) and v.is_integer():
+            v = int(v)
+        if isinstance(v, bool) or not isinstance(v, int):
+            raise ValueError("must be an integer")
+        if not lo <= v <= hi:
+            raise ValueError(f"must be between {lo} and {hi}")
+        return v
+    return check
+
+def number(lo, hi):
+    def check(v):
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v):
+            raise ValueError("must be a number")
+        if not lo <= v <= hi:
+            raise ValueError(f"must be between {lo} and {hi}")
+        return v
+    return check
+
+def string(min_len, max_len):
+    def check(v):
+        if not isinstance(v, str):
+            raise ValueError("must be a string")
+        if not min_len <= len(v) <= max_len:
+            raise ValueError(f"must be {min_len}-{max_len} characters")
+        return v
+    return check
+
+def string_list(max_items, max_len):
+    item = string(1, max_len)
+    def check(v):
+        if not isinstance(v, list):
+            raise ValueError("must be a list")
+        if len(v) > max_items:
+            raise ValueError(f"must have at most {max_items} entries")
+        return [item(x) for x in v]
+    return check
+
+# Nested objects are plain dicts of validators; merge patches recurse into them.
+# tier: "basic" fields anyone who manages the guild may change, "premium" needs VRTEX+.
+SCHEMA = {
+    "currency":          ("basic", string(1, 32)),
+    "tax":               ("basic", integer(0, 100)),
+    "prefix":            ("basic", string(1, 8)),
+    "disabled_commands": ("basic", string_list(200, 32)),
+    "daily_amount":      ("premium", integer(0, 1_000_000_000)),
+    "drop_amount":       ("premium", integer(0, 1_000_000_000)),
+    "work_multiplier":   ("premium", number(0.1, 10.0)),
+    "cooldowns":         ("premium", {"drop_seconds": integer(0, 7 * 86400)}),
+}
+FIELDS = {name: spec for name, (_, spec) in SCHEMA.items()}
+PREMIUM = frozenset(name for name, (tier, _) in SCHEMA.items() if tier == "premium")
+
+def merge_patch(target, patch, defaults=None, fields=FIELDS, path=""):
+    # RFC 7396 onto a copy of target, validating as it goes; null resets a field
+    # to its default (or removes it when there is none). Raises Invalid.
+    if not isinstance(patch, dict):
+        raise Invalid(path.rstrip(".") or "settings", "must be an object")
+    defaults = defaults or {}
+    out = dict(target) if isinstance(target, dict) else {}
+    for k, v in patch.items():
+        spec = fields.get(k)
+        if spec is None:
+            raise Invalid(path + k, "unknown setting")
+        if v is None:
+            if k in defaults:
+                out[k] = copy.deepcopy(defaults[k])
+            else:
+                out.pop(k, None)
+        elif isinstance(spec, dict):
+            out[k] = merge_patch(out.get(k), v, defaults.get(k), spec, path + k + ".")
+        else:
+            try:
+                out[k] = spec(v)
+            except ValueError as e:
+                raise Invalid(path + k, str(e)) from None
+    return out
+
+def diff(old, new):
+    # the merge patch that turns old into new; {} when they are equal
+    old = old or {}
+    out = {}
+    for k, v in new.items():
+        if k not in old:
+            out[k] = v
+        elif old[k] != v:
+            out[k] = diff(old[k], v) if isinstance(v, dict) and isinstance(old[k], dict) else v
+    for k in old:
+        if k not in new:
+            out[k] = None
+    return out
+
+def validate(settings):
+    # a whole settings document (e.g. from an import); raises Invalid
+    if isinstance(settings, dict) and any(v is None for v in settings.values()):
+        raise Invalid(next(k for k, v in settings.items() if v is None), "must not be null")
+    return merge_patch({}, settings)
@@ -0,0 +1,467 @@
+# settings_store.py
+# In-memory guild settings backed by server_settings.json plus an append-only
+# change journal. The snapshot is loaded once; every write appends to the
+# journal and a background thread folds the journal back into the snapshot,
+# so reads and writes cost the same for 100 or 100k guilds.
+#
+# Several processes (gunicorn workers) can share the files: writes take an
+# exclusive flock on server_settings.json.lock, first replay whatever other
+# workers appended, then append and fsync. Reads stat the journal and replay
+# only the new tail. Compaction runs once the journal holds compact_after
+# entries and swaps in a fresh journal whose first line is
+# {"gen": N, "seq": S}, so workers can tell a new journal from the one they
+# were reading even if the inode number is reused. A worker that has already
+# applied everything up to S moves straight on to the new journal instead of
+# re-reading the snapshot. A torn last line (a writer died
+# mid-append, or the disk filled up) is cut off by the next writer before it
+# appends, so a new entry is never glued onto it. Every write gets the next
+# global sequence number, which
+# is also the guild's version (used for ETag / If-Match). Versions live in a
+# sidecar file so server_settings.json keeps its {guild_id: settings} shape.
+#
+# Recent changes (ours and those replayed from other workers) are kept in a
+# bounded feed of per-guild deltas ordered by version, for the change feed.
+
+import copy, json, os, pathlib, threading, time
+from collections import deque
+from contextlib import contextmanager
+from metrics import REGISTRY
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking on this platform: run a single worker
+    fcntl = None
+
+SETTINGS_OP = REGISTRY.histogram("settings_op_duration_seconds", "Settings store operation latency.", ("op",))
+SETTINGS_BYTES = REGISTRY.counter("settings_bytes_written_total", "Bytes written by the settings store.", ("file",))
+
+class VersionConflict(Exception):
+    def __init__(self, guild_id, version):
+        super().__init__(f"guild {guild_id} is at version {version}")
+        self.guild_id = guild_id
+        self.version = version
+
+class SettingsStore:
+    def __init__(self, path, compact_after=1000, compact_interval=5.0, fsync=True, feed_size=10000):
+        self.path = pathlib.Path(path)
+        self.journal_path = pathlib.Path(f"{self.path}.journal")
+        self.versions_path = pathlib.Path(f"{self.path}.versions")
+        self.lock_path = pathlib.Path(f"{self.path}.lock")
+        self.compact_after = compact_after
+        self.compact_interval = compact_interval
+        self.fsync = fsync
+        self._data = {}
+        self._versions = {}
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._lock_fd = None
+        self._journal = None
+        self._ino = None        # inode of the journal we have replayed
+        self._gen = 0           # its generation header (0: legacy journal without one)
+        self._offset = 0        # bytes of that journal already applied
+        self._entries = 0       # entries in that journal (compaction trigger)
+        self._seen = None       # (inode, size, mtime) of the journal when last in sync
+        self._dirty = False     # a failed append may have left bytes we could not cut off
+        self._feed = deque(maxlen=feed_size)
+        self._feed_seq = None   # newest version in the feed; None until first load
+        self._feed_floor = 0    # changes at or below this version are no longer in the feed
+        self._feed_cond = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- cross-process locking ----
+    @contextmanager
+    def _locked(self, exclusive=True):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            if self._lock_fd is None:
+                self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    # ---- loading ----
+    def load(self):
+        with SETTINGS_OP.time("load"), self._locked():
+            self._reload()
+            self._repair()
+            if self._offset == 0:
+                # brand-new journal: stamp a generation header
+                header = self._header(self._gen + 1, self._seq)
+                self._append(header)
+                self._gen, self._offset = self._gen + 1, len(header)
+                self._mark()
+        return self
+
+    @staticmethod
+    def _header(gen, seq):
+        # seq: the newest version folded into the snapshot this journal continues
+        return json.dumps({"gen": gen, "seq": seq}).encode("utf-8") + b"\n"
+
+    def _read_header(self):
+        # -> (header dict, its length in bytes); ({}, 0) for a legacy journal
+        with open(self.journal_path, "rb") as f:
+            first = f.readline()
+        try:
+            header = json.loads(first) if first.endswith(b"\n") else {}
+        except ValueError:
+            header = {}
+        return (header, len(first)) if isinstance(header, dict) and "gen" in header else ({}, 0)
+
+    def _read_gen(self):
+        return self._read_header()[0].get("gen", 0)
+
+    def _mark(self):
+        st = os.stat(self.journal_path)
+        self._seen = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _reload(self):
+        # caller holds the lock
+        data = {}
+        if self.path.exists():
+            text = self.path.read_text(encoding="utf-8")
+            if text.strip():
+                data = json.loads(text)
+        meta = {}
+        if self.versions_path.exists():
+            meta = json.loads(self.versions_path.read_text(encoding="utf-8") or "{}")
+        old = self._data
+        self._data = data
+        self._versions = meta.get("versions", {})
+        self._seq = meta.get("seq", 0)
+        first = self._feed_seq is None
+        if not first:
+            # another worker compacted changes we had not replayed yet
+            missed = sorted((v, g) for g, v in self._versions.items() if v > self._feed_seq)
+            for v, g in missed:
+                self._emit(g, old.get(g), data.get(g), v)
+        self._gen, self._offset, self._entries = 0, 0, 0
+        self._open_journal()
+        self._replay_tail()
+        self._mark()
+        if first:
+            # the feed starts at whatever is on disk now
+            self._feed_seq = self._feed_floor = self._seq
+
+    def _open_journal(self):
+        if self._journal:
+            self._journal.close()
+        # unbuffered: a failed write must not leave bytes behind to be flushed later
+        self._journal = open(self.journal_path, "ab", buffering=0)
+        self._ino = os.fstat(self._journal.fileno()).st_ino
+
+    def _repair(self):
+        # caller holds the exclusive lock and has replayed every complete line:
+        # anything past self._offset is a torn line, cut it off before appending
+        if os.fstat(self._journal.fileno()).st_size > self._offset:
+            os.ftruncate(self._journal.fileno(), self._offset)
+            self._mark()
+
+    def _append(self, blob):
+        # caller holds the exclusive lock; on failure the journal is cut back to
+        # self._offset, or reloaded before the next append if even that fails
+        fd = self._journal.fileno()
+        try:
+            view = memoryview(blob)
+            while view:
+                view = view[os.write(fd, view):]
+            if self.fsync:
+                os.fsync(fd)
+        except BaseException:
+            try:
+                os.ftruncate(fd, self._offset)
+            except OSError:
+                self._dirty = True
+            raise
+
+    def _replay_tail(self):
+        # apply complete lines appended since self._offset; caller holds the lock
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1   # ignore a torn trailing line
+        for line in chunk[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if "gen" in entry:
+                self._gen = entry["gen"]
+                continue
+            self._apply(entry["g"], entry["s"], entry.get("v", 0))
+            self._entries += 1
+        self._offset += end
+
+    def _apply(self, gid, settings, version):
+        prev = self._data.get(gid)
+        self._data[gid] = settings
+        self._versions[gid] = version
+        self._seq = max(self._seq, version)
+        if self._feed_seq is not None and version > self._feed_seq:
+            self._emit(gid, prev, settings, version)
+
+    def _emit(self, gid, prev, new, version):
+        # caller holds the lock
+        prev, new = prev or {}, new or {}
+        change = {"guild_id": gid, "version": version,
+                  "delta": {k: v for k, v in new.items() if prev.get(k, object()) != v}}
+        removed = [k for k in prev if k not in new]
+        if removed:
+            change["removed"] = removed
+        if len(self._feed) == self._feed.maxlen:
+            self._feed_floor = self._feed[0]["version"]
+        self._feed.append(change)
+        self._feed_seq = version
+        self._feed_cond.notify_all()
+
+    def _catch_up(self):
+        # caller holds the lock; another worker may have appended or compacted
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return self._reload()
+        if (st.st_ino, st.st_size, st.st_mtime_ns) == self._seen:
+            return
+        if st.st_ino != self._ino or st.st_size < self._offset or self._read_gen() != self._gen:
+            if not self._follow():
+                self._reload()
+            return
+        self._replay_tail()
+        self._mark()
+
+    def _follow(self):
+        # caller holds the lock. After another worker's compaction the new snapshot
+        # is what we already hold in memory, provided we had applied every entry
+        # it folded in: then only the new journal needs replaying, not the snapshot.
+        header, size = self._read_header()
+        if header.get("gen") != self._gen + 1 or header.get("seq", float("inf")) > self._seq:
+            return False
+        self._open_journal()
+        self._gen, self._offset, self._entries = header["gen"], size, 0
+        self._replay_tail()   # entries we already applied just set the same values again
+        self._mark()
+        return True
+
+    def stale(self):
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return True
+        return (st.st_ino, st.st_size, st.st_mtime_ns) != self._seen
+
+    def refresh(self):
+        if self.stale():
+            with self._locked(exclusive=False):
+                self._catch_up()
+
+    # ---- reads ----
+    def get(self, guild_id, default=None):
+        return self.get_versioned(guild_id, default)[0]
+
+    def get_versioned(self, guild_id, default=None):
+        t0 = time.perf_counter()
+        self.refresh()
+        gid = str(guild_id)
+        with self._lock:
+            s = self._data.get(gid)
+            version = self._versions.get(gid, 0)
+        s = copy.deepcopy(default if s is None else s)
+        SETTINGS_OP.observe(time.perf_counter() - t0, "get")
+        return s, version
+
+    def version(self, guild_id):
+        self.refresh()
+        with self._lock:
+            return self._versions.get(str(guild_id), 0)
+
+    def snapshot(self, match=None):
+        # -> (version cursor, [(guild_id, settings, version)]) as of one instant; the
+        # settings objects are shared with the store (never mutated in place), not copies
+        self.refresh()
+        with self._lock:
+            return self._seq, [(g, s, self._versions.get(g, 0)) for g, s in self._data.items()
+                               if match is None or match(g)]
+
+    # ---- change feed ----
+    def changes_since(self, cursor, match=None, limit=500):
+        # -> (changes, next cursor, resync); resync means changes after `cursor` were
+        # dropped from the feed and the consumer must reload full state first
+        with self._lock:
+            if cursor < self._feed_floor:
+                return [], self._feed_seq, True
+            scanned = []
+            for change in reversed(self._feed):
+                if change["version"] <= cursor:
+                    break
+                scanned.append(change)
+            scanned.reverse()
+            scanned = scanned[:limit]
+            next_cursor = scanned[-1]["version"] if scanned else max(cursor, self._feed_seq)
+        changes = [c for c in scanned if match is None or match(c["guild_id"])]
+        return copy.deepcopy(changes), next_cursor, False
+
+    def wait_changes(self, cursor, timeout, match=None, limit=500, poll=0.05):
+        # long-poll: own writes wake us at once, other workers' within `poll` seconds
+        deadline = time.monotonic() + timeout
+        while True:
+            self.refresh()
+            changes, next_cursor, resync = self.changes_since(cursor, match, limit)
+            remaining = deadline - time.monotonic()
+            if changes or resync or not remaining > 0:
+                return changes, next_cursor, resync
+            # filtered-out changes still advance the cursor
+            cursor = next_cursor
+            with self._feed_cond:
+                if self._feed_seq <= cursor:
+                    self._feed_cond.wait(min(poll, remaining))
+
+    def __contains__(self, guild_id):
+        self.refresh()
+        return str(guild_id) in self._data
+
+    def __len__(self):
+        self.refresh()
+        return len(self._data)
+
+    # ---- writes ----
+    def set(self, guild_id, settings, if_match=None):
+        return self.update(guild_id, lambda current: settings, if_match)
+
+    def set_many(self, updates):
+        return self.update_many({g: (lambda current, s=s: s) for g, s in updates.items()})
+
+    def update(self, guild_id, mutate, if_match=None):
+        # mutate(current settings or None) -> new settings, applied atomically across workers
+        expected = {guild_id: if_match} if if_match is not None else None
+        return self.update_many({guild_id: mutate}, expected)[str(guild_id)]
+
+    def update_many(self, mutations, if_match=None):
+        # if_match: {guild_id: collection of acceptable versions}; a mismatch raises
+        # VersionConflict before anything is written. Returns {guild_id: (settings, version)}.
+        t0 = time.perf_counter()
+        with self._locked():
+            if self._dirty:
+                self._reload()
+                self._dirty = False
+            self._catch_up()
+            self._repair()
+            for g, accepted in (if_match or {}).items():
+                current = self._versions.get(str(g), 0)
+                if current not in accepted:
+                    raise VersionConflict(str(g), current)
+            results, lines = {}, []
+            seq = self._seq
+            for g, mutate in mutations.items():
+                gid = str(g)
+                new = copy.deepcopy(mutate(copy.deepcopy(self._data.get(gid))))
+                seq += 1
+                results[gid] = (new, seq)
+                lines.append(json.dumps({"g": gid, "v": seq, "s": new},
+                                        ensure_ascii=False, separators=(",", ":")) + "\n")
+            blob = "".join(lines).encode("utf-8")
+            self._append(blob)
+            for gid, (new, version) in results.items():
+                self._apply(gid, new, version)
+            self._offset += len(blob)
+            self._entries += len(results)
+            self._mark()
+            if self._entries >= self.compact_after:
+                self._wake.set()
+        SETTINGS_BYTES.inc("journal", amount=len(blob))
+        SETTINGS_OP.observe(time.perf_counter() - t0, "write")
+        return {gid: (copy.deepcopy(s), v) for gid, (s, v) in results.items()}
+
+    # ---- compaction ----
+    def compact(self, min_entries=1):
+        # folds the journal into the snapshot once it holds at least min_entries
+        with self._compact_lock:
+            with self._locked():
+                self._catch_up()
+                if not self._entries or self._entries < min_entries:
+                    return False
+                snapshot, meta = dict(self._data), {"seq": self._seq, "versions": dict(self._versions)}
+                gen, upto = self._gen, self._offset
+            # serialize outside the lock; writers keep appending meanwhile
+            t0 = time.perf_counter()
+            # per-process temp names: other workers may be serializing at the same time
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            vtmp = self.versions_path.with_name(f"{self.versions_path.name}.{os.getpid()}.tmp")
+            written = self._write_file(tmp, json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            self._write_file(vtmp, json.dumps(meta, separators=(",", ":")).encode("utf-8"))
+            with self._locked():
+                self._catch_up()
+                if self._gen != gen:
+                    # another worker compacted first
+                    tmp.unlink(missing_ok=True)
+                    vtmp.unlink(missing_ok=True)
+                    return False
+                # versions first: after a crash the journal replay reapplies newer entries either way
+                os.replace(vtmp, self.versions_path)
+                os.replace(tmp, self.path)
+                # carry over entries appended while we were serializing
+                with open(self.journal_path, "rb") as f:
+                    f.seek(upto)
+                    tail = f.read(self._offset - upto)   # complete lines only
+                header = self._header(gen + 1, meta["seq"])
+                jtmp = self.journal_path.with_name(f"{self.journal_path.name}.{os.getpid()}.tmp")
+                self._write_file(jtmp, header + tail)
+                os.replace(jtmp, self.journal_path)
+                self._open_journal()
+                self._gen = gen + 1
+                self._offset = len(header) + len(tail)
+                self._entries = tail.count(b"\n")
+                self._mark()
+            SETTINGS_BYTES.inc("snapshot", amount=written)
+            SETTINGS_OP.observe(time.perf_counter() - t0, "compact")
+            return True
+
+    @staticmethod
+    def _write_file(p, blob):
+        with open(p, "wb") as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        return len(blob)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="settings-compactor", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.compact_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                # keep up with other workers (and their compactions) here rather
+                # than in the next request, then fold once the journal is long enough
+                self.refresh()
+                self.compact(self.compact_after)
+            except OSError as e:
+                print("settings compaction failed:", e)
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.compact()
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
@@ -0,0 +1,217 @@
+# shared_cache.py
+# Shared cache tier on a Redis-protocol server (Redis, Valkey, KeyDB, or
+# bench/fake_redis.py locally), spoken directly over RESP so there is no client
+# library to install. Values are JSON under <prefix><cache>:<generation>:<key>
+# with the cache's TTL. Invalidations go out on <prefix>invalidate and each
+# process drops the named keys from its local tier; clear() moves a cache to a
+# new generation, so old entries are simply never read again and expire.
+#
+# The tier is best effort: a timeout or a dead server counts as a miss, and the
+# server is not tried again for RETRY seconds. A broken subscription clears
+# every local tier on reconnect, since invalidations may have been missed.
+
+import json, os, secrets, socket, threading, time
+from urllib.parse import urlsplit, unquote
+from metrics import REGISTRY
+
+SHARED_CACHE_ERRORS = REGISTRY.counter("shared_cache_errors_total", "Failed shared cache tier calls.", ("op",))
+MISSING = object()
+
+class RespError(Exception):
+    pass
+
+class RespConnection:
+    def __init__(self, host, port, db=0, password=None, timeout=0.25):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.call("AUTH", password)
+        if db:
+            self.call("SELECT", db)
+
+    def send(self, *args):
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            a = a if isinstance(a, bytes) else str(a).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(a), a))
+        self.sock.sendall(b"".join(out))
+
+    def read(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RespError(rest.decode(errors="replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.reader.read(n + 2)
+            if len(data) != n + 2:
+                raise ConnectionError("connection closed")
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self.read() for _ in range(n)]
+        raise ConnectionError(f"bad reply {line[:20]!r}")
+
+    def call(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+class RedisTier:
+    RETRY = 5.0   # seconds to leave a failed server alone
+
+    def __init__(self, url, prefix="vrtex:", timeout=0.25):
+        u = urlsplit(url)
+        self.host, self.port = u.hostname or "127.0.0.1", u.port or 6379
+        self.db = int(u.path.lstrip("/") or 0)
+        self.password = unquote(u.password) if u.password else None
+        self.prefix = prefix
+        self.timeout = timeout
+        self.channel = prefix + "invalidate"
+        self.origin = f"{os.getpid()}-{secrets.token_hex(4)}"   # our own invalidations come back; skip them
+        self._local = threading.local()   # one connection per thread
+        self._down_until = 0.0
+        self._gens = {}        # cache name -> generation, read from the server on first use
+        self._listeners = {}   # cache name -> callback(keys or None for everything)
+        self._listener = None
+        self._sub = None       # the listener's connection
+        self._lock = threading.Lock()
+        self._stop = False
+
+    def _connect(self, timeout):
+        return RespConnection(self.host, self.port, self.db, self.password, timeout)
+
+    def _call(self, op, *args, default=None):
+        # one command on this thread's connection; default on any failure
+        if time.monotonic() < self._down_until:
+            return default
+        conn = getattr(self._local, "conn", None)
+        try:
+            if conn is None:
+                conn = self._local.conn = self._connect(self.timeout)
+            return conn.call(*args)
+        except (OSError, RespError, ValueError):
+            SHARED_CACHE_ERRORS.inc(op)
+            if conn is not None:
+                conn.close()
+            self._local.conn = None
+            self._down_until = time.monotonic() + self.RETRY
+            return default
+
+    def _gen(self, cache):
+        gen = self._gens.get(cache)
+        if gen is None:
+            value = self._call("gen", "GET", f"{self.prefix}{cache}:gen", default=MISSING)
+            if value is MISSING:
+                return 0   # not cached, so a later call asks the server again
+            gen = self._gens[cache] = int(value or 0)
+        return gen
+
+    def _key(self, cache, key):
+        return f"{self.prefix}{cache}:{self._gen(cache)}:{key}"
+
+    def get(self, cache, key, default=None):
+        raw = self._call("get", "GET", self._key(cache, key))
+        if raw is None:
+            return default
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return default
+
+    def set(self, cache, key, value, ttl):
+        self._call("set", "SET", self._key(cache, key), json.dumps(value, separators=(",", ":")),
+                   "PX", max(1, int(ttl * 1000)))
+
+    def invalidate(self, cache, keys):
+        # drop keys here and from every process's local tier
+        keys = [str(k) for k in keys]
+        if keys:
+            self._call("invalidate", "DEL", *(self._key(cache, k) for k in keys))
+            self._publish(cache, keys, self._gen(cache))
+
+    def clear(self, cache):
+        gen = self._call("clear", "INCR", f"{self.prefix}{cache}:gen")
+        if gen is not None:
+            self._gens[cache] = gen
+            self._publish(cache, None, gen)
+
+    def _publish(self, cache, keys, gen):
+        self._call("publish", "PUBLISH", self.channel,
+                   json.dumps([self.origin, cache, keys, gen], separators=(",", ":")))
+
+    # ---- invalidation listener ----
+    def subscribe(self, cache, callback):
+        with self._lock:
+            self._listeners[cache] = callback
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="cache-invalidate", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        connected_before = False
+        while not self._stop:
+            conn = None
+            try:
+                conn = self._sub = self._connect(self.timeout)
+                conn.call("SUBSCRIBE", self.channel)
+                conn.sock.settimeout(None)
+                if connected_before:
+                    self._missed()
+                connected_before = True
+                while not self._stop:
+                    msg = conn.read()
+                    if isinstance(msg, list) and len(msg) == 3 and msg[0] == b"message":
+                        self._dispatch(msg[2])
+            except (OSError, RespError, ValueError):
+                if self._stop:
+                    return
+                SHARED_CACHE_ERRORS.inc("subscribe")
+                if connected_before:
+                    self._missed()
+                time.sleep(self.RETRY)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _dispatch(self, raw):
+        try:
+            origin, cache, keys, gen = json.loads(raw)
+        except (ValueError, TypeError):
+            return
+        if keys is None:
+            self._gens[cache] = gen
+        if origin == self.origin:
+            return
+        callback = self._listeners.get(cache)
+        if callback is not None:
+            callback(keys)
+
+    def _missed(self):
+        # invalidations may have been lost: forget generations and empty every local tier
+        self._gens.clear()
+        for callback in list(self._listeners.values()):
+            callback(None)
+
+    def close(self):
+        self._stop = True
+        conn = self._sub
+        if conn is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,116 @@
+# startup.py
+# Cold-start support. StartupProfiler times import and initialization phases
+# from the moment app.py starts executing up to the first response; Lazy
+# builds a module-level object (settings store, Discord client, ...) on first
+# use, so a fresh process can answer its first request before the rest is
+# loaded. warm_up() builds everything that is still pending.
+#
+#   STARTUP_PROFILE=1   log the phase breakdown after the first response
+#   WARM_UP=after_first (default) warm up in the background once the first
+#           response is out; "eager" before serving; "off" only on demand
+
+import sys, threading, time
+from contextlib import contextmanager
+
+T0 = time.perf_counter()
+
+class StartupProfiler:
+    def __init__(self, started=T0):
+        self.started = started
+        self.phases = []   # (name, seconds)
+        self.first_response = None   # seconds from start to the first response
+        self._last = started
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        # everything since the previous mark is one phase
+        now = time.perf_counter()
+        with self._lock:
+            self.phases.append((name, now - self._last))
+            self._last = now
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, time.perf_counter() - t0))
+
+    def responded(self):
+        # -> True for the first response only
+        with self._lock:
+            if self.first_response is not None:
+                return False
+            self.first_response = time.perf_counter() - self.started
+            return True
+
+    def report(self):
+        lines = [f"{name:<28}{seconds * 1000:9.1f} ms" for name, seconds in self.phases]
+        if self.first_response is not None:
+            lines.append(f"{'first response after':<28}{self.first_response * 1000:9.1f} ms")
+        return "\n".join(lines)
+
+    def collect(self):
+        # metrics.REGISTRY collector
+        out = [("startup_phase_seconds", "gauge", "Time spent in each startup phase.",
+                [({"phase": name}, seconds) for name, seconds in self.phases])]
+        if self.first_response is not None:
+            out.append(("startup_first_response_seconds", "gauge",
+                        "Time from app.py starting to execute to the first response.",
+                        [({}, self.first_response)]))
+        return out
+
+PROFILER = StartupProfiler()
+PENDING = []   # Lazy objects in creation order
+
+class Lazy:
+    # Stands in for the object factory() returns and builds it on first attribute
+    # access. Only attribute access, len(), `in` and [] are forwarded.
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+        PENDING.append(self)
+
+    def _resolve(self):
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    with PROFILER.phase(f"lazy:{self._name}"):
+                        self._value = self._factory()
+                value = self._value
+        return value
+
+    @property
+    def _ready(self):
+        return self._value is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def __contains__(self, key):
+        return key in self._resolve()
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+def warm_up(extra=()):
+    # build every pending Lazy, then run extra hooks (e.g. pre-rendering pages)
+    for lazy in list(PENDING):
+        lazy._resolve()
+    for hook in extra:
+        with PROFILER.phase(f"warm:{hook.__name__}"):
+            hook()
+
+def in_background(fn):
+    threading.Thread(target=fn, name="warm-up", daemon=True).start()
+
+def log_report():
+    print("startup profile:\n" + PROFILER.report(), file=sys.stderr, flush=True)
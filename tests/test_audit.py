@@ -0,0 +1,65 @@
+# tests/test_audit.py
+# Audit log queries and their paging, including records that share a timestamp.
+#
+#   python -m pytest -q tests
+
+import pathlib, sys, types
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import audit
+from audit import AuditLog
+
+def write_log(directory, monkeypatch, timestamps, segment_bytes=8 << 20):
+    # one record per timestamp, guild ids 1, 2, 1, 2, ...; tax is the record's index
+    now = [0.0]
+    monkeypatch.setattr(audit, "time", types.SimpleNamespace(time=lambda: now[0]))
+    log = AuditLog(directory, segment_bytes=segment_bytes, max_batch=2, fsync=False).start()
+    for i, ts in enumerate(timestamps):
+        now[0] = ts
+        log.record("u", 1 + i % 2, {"tax": -1}, {"tax": i})
+        log.flush()
+    log.close()
+    return log
+
+def all_pages(log, limit, **filters):
+    pages, before = [], None
+    while True:
+        records, before = log.query(limit=limit, before=before, **filters)
+        pages.append([r["changes"]["tax"] for r in records])
+        if before is None:
+            return pages
+
+def test_pages_do_not_skip_records_sharing_a_timestamp(tmp_path, monkeypatch):
+    log = write_log(tmp_path, monkeypatch, [100.0] * 7 + [101.0, 102.0, 102.0], segment_bytes=300)
+    assert len(log.segments()) >= 2
+    pages = all_pages(log, 3)
+    assert [len(p) for p in pages] == [3, 3, 3, 1]
+    seen = [tax for page in pages for tax in page]
+    assert sorted(seen) == list(range(10))
+    assert seen[:3] == [9, 8, 7]   # newest first; equal timestamps in write order, reversed
+
+def test_filters_apply_across_pages(tmp_path, monkeypatch):
+    log = write_log(tmp_path, monkeypatch, [100.0] * 6 + [200.0] * 4)
+    assert all_pages(log, 2, guild_id=1, until=200.0) == [[4, 2], [0]]
+    assert all_pages(log, 10, since=200.0) == [[9, 8, 7, 6]]
+
+def test_bot_endpoint_pages_with_cursor(tmp_path, monkeypatch):
+    import app
+    log = write_log(tmp_path, monkeypatch, [50.0] * 5)
+    monkeypatch.setattr(app, "audit_log", log)
+    monkeypatch.setattr(app, "BOT_API_TOKEN", "t")
+    client = app.app.test_client()
+    headers = {"Authorization": "Bearer t"}
+    seen, cursor = [], None
+    while True:
+        body = client.get("/bot/api/audit", query_string={"limit": 2, **({"cursor": cursor} if cursor else {})},
+                          headers=headers).get_json()
+        seen += [r["changes"]["tax"] for r in body["records"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [4, 3, 2, 1, 0]
+    bad = client.get("/bot/api/audit", query_string={"cursor": "nope"}, headers=headers)
+    assert bad.status_code == 400 and bad.get_json() == {"error": "bad_cursor"}
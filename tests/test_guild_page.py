@@ -0,0 +1,72 @@
+# tests/test_guild_page.py
+# Keyset pagination of the dashboard's guild listing (app.guild_page).
+#
+#   python -m pytest -q tests
+
+import pathlib, sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+import app
+
+MANAGE = str(app.MANAGE_GUILD)
+
+def managed(names):
+    return app.managed_from([{"id": str(1000 + i), "name": n, "permissions": MANAGE} for i, n in enumerate(names)])
+
+def pages(guilds, **args):
+    # every page in order, following next_cursor to the end
+    out, cursor = [], None
+    while True:
+        body, status = app.guild_page(guilds, dict(args, **({"cursor": cursor} if cursor else {})))
+        assert status == 200
+        out.append(body)
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return out
+
+def test_cursor_round_trip_visits_every_guild_once():
+    guilds = managed([f"Guild {i:02d}" for i in range(7)] + ["alpha", "Alpha", "beta"])
+    result = pages(guilds, limit="3")
+    assert [len(p["guilds"]) for p in result] == [3, 3, 3, 1]
+    seen = [g["id"] for p in result for g in p["guilds"]]
+    assert seen == list(guilds) and len(set(seen)) == len(guilds)
+    assert all(p["total"] == len(guilds) for p in result)
+
+def test_last_page_has_no_cursor():
+    guilds = managed(["a", "b", "c", "d"])
+    body, _ = app.guild_page(guilds, {"limit": "4"})
+    assert len(body["guilds"]) == 4 and body["next_cursor"] is None
+    body, _ = app.guild_page(guilds, {"limit": "2"})
+    body, _ = app.guild_page(guilds, {"limit": "2", "cursor": body["next_cursor"]})
+    assert [g["name"] for g in body["guilds"]] == ["c", "d"] and body["next_cursor"] is None
+    assert app.guild_page({}, {}) == ({"guilds": [], "next_cursor": None, "total": 0}, 200)
+
+def test_search_pages_only_matches():
+    guilds = managed(["Red", "Blue", "Reddish", "green", "bored"])
+    result = pages(guilds, q="RED", limit="1")
+    assert [g["name"] for p in result for g in p["guilds"]] == ["bored", "Red", "Reddish"]
+    assert result[0]["total"] == 3
+
+def test_stale_cursor_continues_after_removed_guild():
+    guilds = managed(["a", "b", "c", "d", "e"])
+    first, _ = app.guild_page(guilds, {"limit": "2"})
+    # by the next request "b" is gone and "aa", which sorts before the cursor, was added
+    guilds = managed(["a", "aa", "c", "d", "e"])
+    body, status = app.guild_page(guilds, {"limit": "2", "cursor": first["next_cursor"]})
+    assert status == 200 and [g["name"] for g in body["guilds"]] == ["c", "d"]
+
+@pytest.mark.parametrize("cursor", ["not base64!", "e30", app.encode_cursor(["a"]), app.encode_cursor([1, 2]), "ZZ"])
+def test_invalid_cursor_is_rejected(cursor):
+    assert app.guild_page(managed(["a"]), {"cursor": cursor}) == ({"error": "bad_cursor"}, 400)
+
+@pytest.mark.parametrize("limit", ["0", "-3", "x"])
+def test_invalid_limit_is_rejected(limit):
+    assert app.guild_page(managed(["a"]), {"limit": limit})[1] == 400
+
+def test_limit_is_capped():
+    guilds = managed([f"g{i:03d}" for i in range(app.MAX_GUILD_PAGE + 5)])
+    body, _ = app.guild_page(guilds, {"limit": "100000"})
+    assert len(body["guilds"]) == app.MAX_GUILD_PAGE and body["next_cursor"]
@@ -0,0 +1,74 @@
+# tests/test_ratelimit.py
+# Token buckets: refill and burst, both backends, and SQLite buckets shared by
+# several worker processes.
+#
+#   python -m pytest -q tests
+
+import pathlib, subprocess, sys, types
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+import ratelimit
+from ratelimit import MemoryBuckets, SqliteBuckets, RateLimiter, take
+
+@pytest.fixture
+def clock(monkeypatch):
+    # both backends read the time through ratelimit.time
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit, "time", types.SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0]))
+    return now
+
+def test_take_refills_up_to_burst():
+    assert take(0.0, 0.0, 2.0, rate=1.0, burst=5) == (1.0, 0.0)
+    assert take(0.0, 0.0, 100.0, rate=1.0, burst=5) == (4.0, 0.0)   # capped at burst
+    tokens, wait = take(0.25, 0.0, 0.0, rate=0.5, burst=5)
+    assert tokens == 0.25 and wait == pytest.approx(1.5)
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_burst_then_refill(backend, clock, tmp_path):
+    buckets = MemoryBuckets() if backend == "memory" else SqliteBuckets(tmp_path / "rl.db")
+    assert [buckets.take("k", 2.0, 3) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("k", 2.0, 3) == pytest.approx(0.5)
+    assert buckets.take("other", 2.0, 3) == 0.0   # buckets are per key
+    clock[0] += 0.5
+    assert buckets.take("k", 2.0, 3) == 0.0
+    assert buckets.take("k", 2.0, 3) > 0
+    clock[0] += 60
+    assert [buckets.take("k", 2.0, 3) for _ in range(4)][-1] > 0   # refilled to burst, no further
+
+def test_memory_buckets_are_bounded():
+    buckets = MemoryBuckets(maxsize=3)
+    for key in "abcde":
+        buckets.take(key, 1.0, 1)
+    assert len(buckets) == 3
+
+def test_sqlite_buckets_purge_idle_rows(clock, tmp_path):
+    buckets = SqliteBuckets(tmp_path / "rl.db")
+    buckets.take("old", 1.0, 1)
+    clock[0] += SqliteBuckets.IDLE + 1
+    for i in range(SqliteBuckets.PURGE_EVERY):
+        buckets.take(f"new{i % 3}", 1.0, 1)
+    keys = {k for k, in buckets._db().execute("SELECT key FROM buckets")}
+    assert keys == {"new0", "new1", "new2"}
+
+def test_sqlite_buckets_are_shared_between_workers(tmp_path):
+    db = tmp_path / "rl.db"
+    SqliteBuckets(db)
+    script = (f"import sys; sys.path.insert(0, {str(ROOT)!r})\n"
+              f"from ratelimit import SqliteBuckets\n"
+              f"b = SqliteBuckets({str(db)!r})\n"
+              f"print(sum(b.take('ip:1:/x', 0.0001, 50) == 0 for _ in range(40)))\n")
+    workers = [subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, text=True) for _ in range(4)]
+    granted = [int(p.communicate(timeout=60)[0]) for p in workers]
+    assert sum(granted) == 50   # 160 attempts, one burst of 50 between all four
+
+def test_rate_limiter_checks_user_and_ip(clock):
+    limiter = RateLimiter(MemoryBuckets(), {"/r": {"user": (1.0, 2), "ip": (1.0, 3)}})
+    assert limiter.check("/r", "u1", "1.2.3.4") == 0.0
+    assert limiter.check("/r", "u1", "1.2.3.4") == 0.0
+    assert limiter.check("/r", "u1", "1.2.3.4") == pytest.approx(1.0)   # user bucket empty
+    assert limiter.check("/r", "u2", "1.2.3.4") > 0   # ip bucket empty now too
+    assert limiter.check("/r", "u3", "5.6.7.8") == 0.0
+    assert limiter.check("/unlimited", "u1", "1.2.3.4") == 0.0
@@ -0,0 +1,86 @@
+# tests/test_settings_schema.py
+# Merge patches, diffs and validators for guild settings, and the premium
+# check the dashboard applies on top of them.
+#
+#   python -m pytest -q tests
+
+import pathlib, sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+from settings_schema import Invalid, PREMIUM, merge_patch, diff, validate
+
+DEFAULTS = {"tax": 5, "prefix": "ve", "cooldowns": {"drop_seconds": 3600}}
+
+def test_null_resets_to_default_or_removes():
+    current = {"tax": 20, "prefix": "!", "currency": "$"}
+    assert merge_patch(current, {"tax": None}, DEFAULTS) == {"tax": 5, "prefix": "!", "currency": "$"}
+    assert merge_patch(current, {"currency": None}, DEFAULTS) == {"tax": 20, "prefix": "!"}
+    assert current == {"tax": 20, "prefix": "!", "currency": "$"}   # target is not modified
+
+def test_nested_merge_keeps_sibling_fields():
+    current = {"cooldowns": {"drop_seconds": 60, "legacy": 1}}
+    assert merge_patch(current, {"cooldowns": {"drop_seconds": 120}}) == {"cooldowns": {"drop_seconds": 120, "legacy": 1}}
+    assert merge_patch({}, {"cooldowns": {"drop_seconds": 10}}) == {"cooldowns": {"drop_seconds": 10}}
+    assert merge_patch(current, {"cooldowns": {"drop_seconds": None}}, DEFAULTS) == {"cooldowns": {"drop_seconds": 3600, "legacy": 1}}
+
+@pytest.mark.parametrize("patch, field", [
+    ({"tax": "5"}, "tax"),
+    ({"tax": True}, "tax"),
+    ({"tax": 101}, "tax"),
+    ({"tax": 2.5}, "tax"),
+    ({"prefix": ""}, "prefix"),
+    ({"prefix": "toolongprefix"}, "prefix"),
+    ({"work_multiplier": float("nan")}, "work_multiplier"),
+    ({"work_multiplier": 50}, "work_multiplier"),
+    ({"disabled_commands": "ban"}, "disabled_commands"),
+    ({"disabled_commands": ["ok", ""]}, "disabled_commands"),
+    ({"cooldowns": {"drop_seconds": -1}}, "cooldowns.drop_seconds"),
+    ({"cooldowns": 5}, "cooldowns"),
+    ({"cooldowns": {"nope": 1}}, "cooldowns.nope"),
+    ({"colour": "red"}, "colour"),
+])
+def test_rejects_bad_types_and_ranges(patch, field):
+    with pytest.raises(Invalid) as e:
+        merge_patch({}, patch)
+    assert e.value.field == field
+
+def test_validators_normalize():
+    assert merge_patch({}, {"tax": 7.0}) == {"tax": 7}
+    assert merge_patch({}, {"work_multiplier": 2}) == {"work_multiplier": 2}
+
+def test_validate_rejects_nulls_in_whole_documents():
+    assert validate({"tax": 3}) == {"tax": 3}
+    with pytest.raises(Invalid):
+        validate({"tax": None})
+
+def test_diff_is_the_patch_between_documents():
+    old = {"tax": 5, "prefix": "ve", "cooldowns": {"drop_seconds": 60}}
+    new = {"tax": 6, "cooldowns": {"drop_seconds": 90}, "currency": "$"}
+    patch = diff(old, new)
+    assert patch == {"tax": 6, "prefix": None, "cooldowns": {"drop_seconds": 90}, "currency": "$"}
+    assert merge_patch(old, patch) == new
+
+def test_noop_patch_has_empty_diff():
+    current = {"tax": 5, "prefix": "ve", "cooldowns": {"drop_seconds": 60}}
+    assert diff(current, merge_patch(current, {"tax": 5, "cooldowns": {"drop_seconds": 60}})) == {}
+    assert diff(current, merge_patch(current, {})) == {}
+
+def test_premium_fields():
+    assert PREMIUM == {"daily_amount", "drop_amount", "work_multiplier", "cooldowns"}
+
+def test_premium_change_needs_plus():
+    import app
+    current = {"tax": 5, "daily_amount": 3000}
+    changed, err = app.check_update(current, {"daily_amount": 10}, is_plus=False)
+    assert changed is None and err[1] == 403 and err[0]["error"] == "premium_required"
+    changed, err = app.check_update(current, {"daily_amount": 10}, is_plus=True)
+    assert err is None and changed == {"daily_amount": 10}
+    # premium fields sent at the value the editor shows are not changes, even if never stored
+    form = {"tax": 6, "daily_amount": 3000, "drop_amount": 1000, "cooldowns": {"drop_seconds": 3600}}
+    changed, err = app.check_update(current, form, is_plus=False)
+    assert err is None and changed["tax"] == 6
+    changed, err = app.check_update(current, {"tax": "x"}, is_plus=True)
+    assert err[1] == 400 and err[0]["field"] == "tax"
@@ -0,0 +1,126 @@
+# tests/test_settings_store.py
+# Journal recovery for the shared settings store: a torn last line must not
+# swallow the next write, neither in the process that wrote it nor in other
+# workers or after a restart.
+#
+#   python -m pytest -q tests
+
+import json, os, pathlib, subprocess, sys, textwrap
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from settings_store import SettingsStore
+
+def run_worker(path, code):
+    # run code in a separate process with `store` loaded from path; -> its stdout
+    script = f"import sys; sys.path.insert(0, {str(ROOT)!r})\n" \
+             f"from settings_store import SettingsStore\n" \
+             f"store = SettingsStore({str(path)!r}, compact_after=10**9).load()\n" + textwrap.dedent(code)
+    return subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+
+def test_write_after_torn_line_reaches_other_workers(tmp_path):
+    path = tmp_path / "server_settings.json"
+    store = SettingsStore(path, compact_after=10**9).load()
+    store.set(1, {"prefix": "!"})
+    with open(store.journal_path, "ab") as f:
+        f.write(b'{"g":"1","v":2,"s":{"pref')   # a writer died mid-append
+    other = json.loads(run_worker(path, """
+        store.set(2, {"prefix": "?"})
+        print(__import__("json").dumps(store.get_versioned(2)))
+    """))
+    assert other == [{"prefix": "?"}, 2]
+    store.refresh()
+    assert store.get_versioned(2) == ({"prefix": "?"}, 2)
+    assert store.get_versioned(1) == ({"prefix": "!"}, 1)
+    restarted = SettingsStore(path, compact_after=10**9).load()
+    assert restarted.get_versioned(2) == ({"prefix": "?"}, 2)
+    assert all(line.endswith(b"\n") for line in store.journal_path.read_bytes().splitlines(keepends=True))
+
+def test_load_cuts_off_torn_line(tmp_path):
+    path = tmp_path / "server_settings.json"
+    SettingsStore(path, compact_after=10**9).load().set(1, {"prefix": "!"})
+    with open(f"{path}.journal", "ab") as f:
+        f.write(b'{"g":"1","v":2,"s"')
+    store = SettingsStore(path, compact_after=10**9).load()
+    store.set(3, {"prefix": "$"})
+    restarted = SettingsStore(path, compact_after=10**9).load()
+    assert restarted.get_versioned(3) == ({"prefix": "$"}, 2)
+
+def test_failed_append_is_cut_back(tmp_path, monkeypatch):
+    path = tmp_path / "server_settings.json"
+    store = SettingsStore(path, compact_after=10**9).load()
+    store.set(1, {"prefix": "!"})
+    size = store.journal_path.stat().st_size
+    def no_space(fd):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(os, "fsync", no_space)
+    try:
+        store.set(2, {"prefix": "?"})
+    except OSError:
+        pass
+    else:
+        raise AssertionError("write should have failed")
+    monkeypatch.undo()
+    assert store.journal_path.stat().st_size == size
+    assert store.get(2) is None
+    store.set(3, {"prefix": "$"})
+    restarted = SettingsStore(path, compact_after=10**9).load()
+    assert restarted.get(2) is None
+    assert restarted.get_versioned(3) == ({"prefix": "$"}, 2)
+
+def test_concurrent_workers_lose_no_writes(tmp_path):
+    path = tmp_path / "server_settings.json"
+    SettingsStore(path, compact_after=10**9).load()
+    workers = [subprocess.Popen([sys.executable, "-c",
+        f"import sys; sys.path.insert(0, {str(ROOT)!r})\n"
+        f"from settings_store import SettingsStore\n"
+        f"store = SettingsStore({str(path)!r}, compact_after=50, fsync=False).load()\n"
+        f"for i in range(100):\n"
+        f"    store.update(1, lambda s: {{'n': (s or {{'n': 0}})['n'] + 1}})\n"
+        f"    store.set('w{w}', {{'i': i}})\n"
+        f"    if i % 25 == 24: store.compact()\n"]) for w in range(4)]
+    for p in workers:
+        assert p.wait(timeout=120) == 0
+    store = SettingsStore(path).load()
+    assert store.get(1) == {"n": 400}
+    assert all(store.get(f"w{w}") == {"i": 99} for w in range(4))
+    assert store.snapshot()[0] == 800
+
+def test_compaction_waits_for_compact_after(tmp_path):
+    store = SettingsStore(tmp_path / "server_settings.json", compact_after=5).load()
+    for g in range(3):
+        store.set(g, {"prefix": str(g)})
+    assert not store.compact(store.compact_after)
+    store.set(3, {"prefix": "3"})
+    store.set(4, {"prefix": "4"})
+    assert store.compact(store.compact_after)
+    assert json.loads((tmp_path / "server_settings.json").read_text())["4"] == {"prefix": "4"}
+
+def test_worker_follows_compaction_without_rereading_snapshot(tmp_path):
+    path = tmp_path / "server_settings.json"
+    a = SettingsStore(path, compact_after=10**9).load()
+    b = SettingsStore(path, compact_after=10**9).load()
+    for g in range(3):
+        a.set(g, {"prefix": str(g)})
+    b.refresh()
+    reloads = []
+    reload = b._reload
+    b._reload = lambda: reloads.append(1) or reload()
+    assert a.compact()
+    a.set(9, {"prefix": "9"})
+    assert b.get_versioned(9) == ({"prefix": "9"}, 4)
+    assert b.get_versioned(1) == ({"prefix": "1"}, 2)
+    assert reloads == []
+    b.set(10, {"prefix": "10"})
+    assert a.get_versioned(10) == ({"prefix": "10"}, 5)
+
+def test_lagging_worker_reloads_after_compaction(tmp_path):
+    path = tmp_path / "server_settings.json"
+    a = SettingsStore(path, compact_after=10**9).load()
+    b = SettingsStore(path, compact_after=10**9).load()
+    for g in range(3):
+        a.set(g, {"prefix": str(g)})
+    assert a.compact()
+    assert b.get_versioned(2) == ({"prefix": "2"}, 3)
+    assert b.changes_since(0)[0][-1]["version"] == 3
@@ -0,0 +1,103 @@
+# tokens.py
+# Discord OAuth token lifetimes. Sessions keep refresh_token, expires_at and
+# refresh_at next to the access token. TokenRefresher renews each token once
+# REFRESH_AT of its lifetime has passed, in the background, and writes it back
+# to the session store, so dashboard calls never meet an expired token. A
+# request that still finds its token within INLINE_MARGIN of expiry (e.g. the
+# schedule was lost in a restart) refreshes it inline instead.
+
+import heapq, threading, time
+from metrics import REGISTRY
+
+TOKEN_REFRESHES = REGISTRY.counter("oauth_token_refreshes_total", "OAuth token refreshes by trigger and outcome.",
+                                   ("trigger", "outcome"))
+REFRESH_AT = 0.8
+INLINE_MARGIN = 60
+
+def store_token(session, token):
+    now = time.time()
+    session["access_token"] = token["access_token"]
+    if token.get("refresh_token"):
+        session["refresh_token"] = token["refresh_token"]
+    if token.get("expires_in"):
+        lifetime = float(token["expires_in"])
+        session["expires_at"] = now + lifetime
+        session["refresh_at"] = now + lifetime * REFRESH_AT
+
+def needs_refresh(session):
+    return "refresh_token" in session and session.get("expires_at", float("inf")) - time.time() < INLINE_MARGIN
+
+class TokenRefresher:
+    def __init__(self, backend, refresh, on_refresh=None, retry=60.0):
+        # backend: session store (get/set); refresh(refresh_token) -> new token dict,
+        # None if Discord rejected it, or raises on a transient failure
+        self.backend = backend
+        self.refresh = refresh
+        self.on_refresh = on_refresh
+        self.retry = retry
+        self._heap = []   # (refresh_at, sid)
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def schedule(self, sid, session):
+        if sid and "refresh_at" in session and "refresh_token" in session:
+            self._push(session["refresh_at"], sid)
+
+    def _push(self, at, sid):
+        with self._cond:
+            heapq.heappush(self._heap, (at, sid))
+            self._cond.notify()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _refresh(self, sid):
+        data = self.backend.get(sid)
+        if not data or "refresh_token" not in data:
+            return   # logged out or expired
+        if data.get("refresh_at", 0) > time.time() + 1:
+            return self.schedule(sid, data)   # already refreshed inline or by another worker
+        try:
+            token = self.refresh(data["refresh_token"])
+        except Exception:
+            TOKEN_REFRESHES.inc("background", "error")
+            return self._push(time.time() + self.retry, sid)
+        if token is None:
+            TOKEN_REFRESHES.inc("background", "rejected")
+            return   # the next request near expiry finds out and asks for a new login
+        old = data["access_token"]
+        store_token(data, token)
+        if self.backend.get(sid) is None:
+            return   # logged out while we were refreshing
+        self.backend.set(sid, data)
+        TOKEN_REFRESHES.inc("background", "ok")
+        if self.on_refresh:
+            self.on_refresh(old, data["access_token"])
+        self.schedule(sid, data)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop and (not self._heap or self._heap[0][0] > time.time()):
+                    self._cond.wait(self._heap[0][0] - time.time() if self._heap else None)
+                if self._stop:
+                    return
+                _, sid = heapq.heappop(self._heap)
+            try:
+                self._refresh(sid)
+            except Exception:
+                TOKEN_REFRESHES.inc("background", "error")
+
+    def close(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=5)